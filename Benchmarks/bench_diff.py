@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Import libraries
+import argparse
+import os
+import random
+import sys
+import time
+
+# Import mods from the Crystal Report Validation folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                             'Crystal Report Validation'))
+import crystal_cleanup as cc
+
+'''
+Benchmark the environment diff engine (crystal_cleanup.diff_envs) with
+synthetic reports across six environments. The time per report should stay
+about the same as the number of reports grows (linear scaling).
+'''
+
+# Environments to create besides production
+env_names = ['Closing', 'DEV', 'TEST', 'QA', 'SSDEV2', 'SSDEV3']
+
+
+###############################################################################
+def make_envs(count, seed = 0):
+    '''
+    Create synthetic report dictionaries for production and the other envs.
+        Parameters:
+            count: number of reports in production
+            seed: seed for the random values
+        Return:
+            A list of the report dictionaries:
+                0 - master_dict: reports in production
+                1 - env_reports: keys:env names, values:reports in the env
+    '''
+    rand = random.Random(seed)
+    master_dict = {"FOLDER%02d - Report%06d" % (i % 40, i):
+                   "%02d/01/2022" % rand.randrange(1, 13)
+                   for i in range(count)}
+    env_reports = {}
+
+    for name in env_names:
+        reports = {}
+        for report, date in master_dict.items():
+            roll = rand.random()
+
+            # About 5% missing, 5% with a different date
+            if roll < 0.05:
+                continue
+            reports[report] = date if roll > 0.1 else "12/31/2021"
+
+        # About 2% added reports that aren't in production
+        for i in range(count // 50):
+            reports["ADDED - %s Report%06d" % (name, i)] = "01/01/2022"
+
+        env_reports[name] = reports
+
+    return (master_dict, env_reports)
+
+
+###############################################################################
+def main():
+    '''
+    Run the benchmark.
+    '''
+    parser = argparse.ArgumentParser(description = "Benchmark the diff "
+                                     "engine for the inventory.")
+    parser.add_argument('--reports', type = int, default = 100000,
+                        help = "number of reports at the largest size")
+    parser.add_argument('--steps', type = int, default = 4,
+                        help = "number of sizes to time (halving each step)")
+    args = parser.parse_args()
+
+    sizes = [args.reports // 2 ** i for i in reversed(range(args.steps))]
+
+    print("%10s %10s %14s" % ("reports", "seconds", "us/report/env"))
+    for size in sizes:
+        master_dict, env_reports = make_envs(size)
+
+        start = time.perf_counter()
+        columns, added = cc.diff_envs(master_dict, env_reports)
+        elapsed = time.perf_counter() - start
+
+        print("%10d %10.3f %14.3f" % (size, elapsed,
+                                      elapsed * 1e6 / size / len(env_names)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# Import libraries
+import argparse
+import os
+import random
+import sys
+import time
+from dateutil.parser import parse
+
+# Import mods from the Crystal Report Validation folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                             'Crystal Report Validation'))
+from log_dates import DateParser
+
+'''
+Benchmark the DLV_Use_Log timestamp parsing: dateutil's general parser against
+the detected fixed-format parser, on a synthetic log of a million lines.
+'''
+
+
+###############################################################################
+def make_lines(count, seed = 0):
+    '''
+    Create synthetic DLV Use Log lines.
+        Parameters:
+            count: number of lines to create
+            seed: seed for the random values
+        Return:
+            lines (list): the log lines
+    '''
+    rand = random.Random(seed)
+    lines = []
+
+    for _ in range(count):
+        env = rand.choice(['Production', 'Closing'])
+        hour = rand.randrange(24)
+        stamp = "%d/%d/%d %d:%02d:%02d %s" % (
+            rand.randrange(1, 13), rand.randrange(1, 29),
+            rand.randrange(2015, 2023), hour % 12 or 12, rand.randrange(60),
+            rand.randrange(60), 'AM' if hour < 12 else 'PM')
+        lines.append('"\\\\sal-ssbat-pr01v\\smartsoft\\Crystal Reports - '
+                     'DataLink - ' + env + '\\AP Reports - ' + env + '\\",'
+                     '"Report%04d.rpt","UAB%04d","DLV","x","%s"\n'
+                     % (rand.randrange(5000), rand.randrange(200), stamp))
+
+    return lines
+
+
+###############################################################################
+def time_parser(name, func, stamps):
+    '''
+    Time parsing every timestamp with a function and print the result.
+        Parameters:
+            name: name of the parser to print
+            func: function that parses a timestamp
+            stamps: the timestamps to parse
+        Return:
+            The parsed datetimes
+    '''
+    start = time.perf_counter()
+    dates = [func(stamp) for stamp in stamps]
+    elapsed = time.perf_counter() - start
+
+    print("%-12s %8.2f s  %10.0f lines/s" % (name, elapsed,
+                                             len(stamps) / elapsed))
+    return dates
+
+
+###############################################################################
+def main():
+    '''
+    Run the benchmark.
+    '''
+    parser = argparse.ArgumentParser(description = "Benchmark the DLV use "
+                                     "log timestamp parsing.")
+    parser.add_argument('--lines', type = int, default = 1000000,
+                        help = "number of synthetic log lines")
+    args = parser.parse_args()
+
+    # Pull the timestamp field out the same way dlv_use does
+    stamps = [line.split(',')[5].replace('"', '')
+              for line in make_lines(args.lines)]
+
+    slow = time_parser("dateutil", parse, stamps)
+    date_parser = DateParser()
+    fast = time_parser("fixed", date_parser.parse, stamps)
+
+    # Both paths have to give the same dates
+    if slow != fast:
+        sys.exit("parsed dates don't match")
+
+    print("format: " + str(date_parser.format) + ", slow-path lines: " +
+          str(date_parser.slow_path))
+
+
+if __name__ == '__main__':
+    main()
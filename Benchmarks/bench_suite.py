@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# Import libraries
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime as dt
+
+# Import mods from both tools' folders
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(here, '..', 'Crystal Report Validation'))
+sys.path.append(os.path.join(here, '..', 'oneWeigh Archive'))
+import crystal_cleanup as cc
+import crystal_drift as drift
+import crystal_scan as scan
+import dlv_use as dlv
+import fixtures
+from job_slots import SlotQueue
+import oneweigh as ow
+from ow_copy import CopyStats
+from ow_index import ArchiveIndex
+from scan_cache import ScanCache
+
+'''
+Benchmark every stage of both tools on synthetic fixtures (see fixtures.py):
+    scan - walk the report environments (no cache)
+    scan_cached - walk them again with a warm scan cache
+    drift - fingerprint every report
+    parse - read the whole DLV_Use_Log
+    diff - cross reference the environments into the inventory
+    excel_write - write the inventory workbook
+    copy - archive the forms on every machine
+    copy_indexed - run the archive again with every form already indexed
+
+The results are written to a JSON file, and --compare prints how each stage
+changed from an earlier results file.
+'''
+
+
+###############################################################################
+class Timer:
+    '''
+    This class keeps the time and item count of each stage.
+
+    Attributes:
+        stages (dict): keys:stage names, values:dictionary of seconds, items
+                       and anything else counted for the stage
+    '''
+    def __init__(self):
+        '''
+        Constructor for a Timer with no stages.
+        '''
+        self.stages = {}
+
+    def run(self, name, func, *args):
+        '''
+        Time a stage.
+            Parameters:
+                name: name of the stage
+                func: function to run, returning a dictionary with at least
+                      an items count
+                args: arguments for func
+        '''
+        start = time.perf_counter()
+        result = func(*args)
+        self.stages[name] = {'seconds': time.perf_counter() - start}
+        self.stages[name].update(result)
+
+        print("%-14s %10.3f s %10d items" % (name, self.stages[name]['seconds'],
+                                             self.stages[name]['items']))
+
+
+###############################################################################
+def run_scan(env_paths, cache = None, files = None):
+    '''
+    Scan stage - walk every environment, with each one limited on the server
+    it stands in for.
+    '''
+    env_reports, extras, env_stats = scan.scan_envs(
+        env_paths, cache = cache, files = files,
+        servers = fixtures.env_servers(env_paths))
+    stats = scan.WalkStats()
+    for env in env_stats.values():
+        stats.add(env)
+
+    return {'items': sum(len(reports) for reports in env_reports.values()),
+            'listings': stats.listings, 'stat_calls': stats.stat_calls,
+            'reused_folders': stats.reused_folders}
+
+
+###############################################################################
+def run_drift(env_files, cache):
+    '''
+    Drift stage - fingerprint every report found by the scan.
+    '''
+    env_hashes, env_stats = drift.hash_envs(
+        env_files, cache, servers = fixtures.env_servers(list(env_files)))
+
+    return {'items': sum(stats.reports for stats in env_stats.values()),
+            'bytes': sum(stats.bytes_hashed for stats in env_stats.values())}
+
+
+###############################################################################
+def run_parse(log_path, data):
+    '''
+    Parse stage - read the whole DLV_Use_Log (no checkpoint).
+    '''
+    data['usage'] = dlv.load_usage(log_path, None)
+
+    with open(log_path, 'rb') as file:
+        lines = sum(1 for line in file)
+
+    return {'items': lines, 'bytes': os.path.getsize(log_path)}
+
+
+###############################################################################
+def run_diff(data):
+    '''
+    Diff stage - cross reference the environments into the inventory sheets.
+    '''
+    cl_usage, prod_usage, usage_index = data['usage']
+    data['sheets'] = cc.build_inventory(data['env_reports'], data['extras'],
+                                        cl_usage, prod_usage, 'Production',
+                                        usage_index)
+
+    return {'items': len(data['env_reports']['Production'])}
+
+
+###############################################################################
+def run_excel(path, data):
+    '''
+    Excel write stage - write the inventory workbook.
+    '''
+    cc.write_inventory(path, data['sheets'])
+
+    return {'items': len(data['env_reports']['Production']),
+            'bytes': os.path.getsize(path)}
+
+
+###############################################################################
+def run_copy(forms_path, registry, archive_path, index_path):
+    '''
+    Copy stage - archive the forms on every machine the same way oneweigh.main
+    does (without pinging or retention).
+    '''
+    ow.forms_path = forms_path
+    ow.archive_path = archive_path
+    ow.archive = ArchiveIndex(index_path, archive_path)
+    ow.copy_stats = CopyStats()
+    ow.made_folders.clear()
+
+    archived = 0
+    with ThreadPoolExecutor(max_workers = ow.list_workers) as list_pool, \
+         ThreadPoolExecutor(max_workers = ow.copy_pool_size) as copy_pool:
+        for loc, serial in registry:
+            ow.machine_queues[serial] = SlotQueue(copy_pool,
+                                                  ow.machine_copy_workers)
+            ow.machine_stats[serial] = CopyStats()
+
+        listings = [list_pool.submit(ow.archive_machine, loc, serial)
+                    for loc, serial in registry]
+
+        for listing in as_completed(listings):
+            jobs, removals = listing.result()
+            for form, copy in jobs:
+                archived += copy.result()
+    ow.archive.close()
+
+    for stats in ow.machine_stats.values():
+        ow.copy_stats.merge(stats)
+
+    return {'items': archived, 'bytes': ow.copy_stats.bytes_copied,
+            'skipped': ow.copy_stats.skipped}
+
+
+###############################################################################
+def compare(old_path, stages):
+    '''
+    Print how long each stage took compared to an earlier run.
+        Parameters:
+            old_path: path to the earlier results file
+            stages: stages of this run (from Timer)
+    '''
+    with open(old_path, 'r') as file:
+        old = json.load(file)['stages']
+
+    print("\n%-14s %10s %10s %8s" % ("stage", "before", "after", "ratio"))
+    for name, stage in stages.items():
+        if name not in old:
+            continue
+        before = old[name]['seconds']
+        print("%-14s %10.3f %10.3f %7.2fx" % (name, before, stage['seconds'],
+                                             before / max(stage['seconds'],
+                                                          1e-9)))
+
+
+###############################################################################
+def main():
+    '''
+    Run the benchmark suite.
+    '''
+    parser = argparse.ArgumentParser(description = "Benchmark every stage of "
+                                     "the inventory and the archive on "
+                                     "synthetic fixtures.")
+    parser.add_argument('--reports', type = int, default = 2000,
+                        help = "number of reports in production")
+    parser.add_argument('--log-lines', type = int, default = 200000,
+                        help = "number of lines in the DLV_Use_Log")
+    parser.add_argument('--machines', type = int, default = 10,
+                        help = "number of scale machines")
+    parser.add_argument('--forms', type = int, default = 500,
+                        help = "number of forms on each machine")
+    parser.add_argument('--latency', type = float, default = 0,
+                        help = "milliseconds added to every listing and stat "
+                               "call to act like an SMB share")
+    parser.add_argument('--root', default = None,
+                        help = "folder for the fixtures (default - a temp "
+                               "folder that is removed afterwards)")
+    parser.add_argument('--output', default = 'bench_results.json',
+                        help = "file to write the results to")
+    parser.add_argument('--compare', default = None,
+                        help = "earlier results file to compare against")
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp(prefix = 'bench_')
+    os.makedirs(root, exist_ok = True)
+    try:
+        # Fixtures (not timed as a stage)
+        start = time.perf_counter()
+        env_paths = fixtures.make_envs(os.path.join(root, 'envs'),
+                                       args.reports)
+        log_path = fixtures.make_log(os.path.join(root, 'DLV_Use_Log.txt'),
+                                     args.log_lines, args.reports)
+        forms_path, registry = fixtures.make_forms(
+            os.path.join(root, 'machines'), args.machines, args.forms)
+        print("fixtures created in %.1f s\n" % (time.perf_counter() - start))
+
+        timer = Timer()
+        with fixtures.slow_fs(args.latency / 1000):
+            timer.run('scan', run_scan, env_paths)
+
+            # Warm up the scan cache, then time the run that uses it
+            cache = ScanCache(os.path.join(root, 'scan_cache.db'))
+            run_scan(env_paths, cache)
+            env_files = {}
+            timer.run('scan_cached', run_scan, env_paths, cache, env_files)
+            timer.run('drift', run_drift, env_files, cache)
+            cache.close()
+
+            # Results passed from one stage to the next
+            data = {}
+            data['env_reports'], data['extras'], env_stats = \
+                scan.scan_envs(env_paths,
+                               servers = fixtures.env_servers(env_paths))
+            timer.run('parse', run_parse, log_path, data)
+            timer.run('diff', run_diff, data)
+            timer.run('excel_write', run_excel,
+                      os.path.join(root, 'inventory.xlsx'), data)
+
+            archive_path = os.path.join(root, 'archive') + '/'
+            index_path = os.path.join(root, 'archive_index.db')
+            timer.run('copy', run_copy, forms_path, registry, archive_path,
+                      index_path)
+            timer.run('copy_indexed', run_copy, forms_path, registry,
+                      archive_path, index_path)
+
+    finally:
+        if args.root is None:
+            shutil.rmtree(root, ignore_errors = True)
+
+    # Save the results so later runs can be compared against them
+    results = {'started': dt.now().isoformat(timespec = 'seconds'),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'params': {'reports': args.reports,
+                          'log_lines': args.log_lines,
+                          'machines': args.machines, 'forms': args.forms,
+                          'latency_ms': args.latency},
+               'stages': timer.stages}
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent = 2)
+    print("\nresults written to " + args.output)
+
+    if args.compare:
+        compare(args.compare, timer.stages)
+
+
+if __name__ == '__main__':
+    main()
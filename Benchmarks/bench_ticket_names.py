@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# Import libraries
+import argparse
+import os
+import random
+import sys
+import time
+
+# Import mods from the oneWeigh Archive folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                             'oneWeigh Archive'))
+from ow_ticket import parse_ticket
+
+'''
+Benchmark parsing a directory listing of oneWeigh ticket form names.
+'''
+
+
+###############################################################################
+def make_names(count, seed = 0):
+    '''
+    Create synthetic ticket form names (with a few malformed ones).
+        Parameters:
+            count: number of names to create
+            seed: seed for the random values
+        Return:
+            names (list): the form names
+    '''
+    rand = random.Random(seed)
+    names = []
+
+    for i in range(count):
+        # About 1 in 1000 names isn't a ticket form
+        if rand.random() < 0.001:
+            names.append("Thumbs%d.db" % i)
+            continue
+
+        names.append("ONE_%s_Ticket_064_%07d_%06d_%02d%02d%02d_%08d_%s.PDF" % (
+            rand.choice(['Inbound', 'Outbound']), 65000 + i,
+            rand.randrange(1000000), rand.randrange(18, 23),
+            rand.randrange(1, 13), rand.randrange(1, 29),
+            rand.randrange(100000000), rand.choice(['KXS', 'MHB'])))
+
+    return names
+
+
+###############################################################################
+def main():
+    '''
+    Run the benchmark.
+    '''
+    parser = argparse.ArgumentParser(description = "Benchmark parsing ticket "
+                                     "form names.")
+    parser.add_argument('--forms', type = int, default = 100000,
+                        help = "number of form names in the listing")
+    args = parser.parse_args()
+
+    names = make_names(args.forms)
+
+    start = time.perf_counter()
+    tickets = [parse_ticket(name) for name in names]
+    elapsed = time.perf_counter() - start
+
+    skipped = sum(1 for ticket in tickets if ticket is None)
+    print("%d forms parsed in %.3f s (%d skipped)" % (len(names), elapsed,
+                                                      skipped))
+
+
+if __name__ == '__main__':
+    main()
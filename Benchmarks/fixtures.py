@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# Import libraries
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime as dt, timedelta
+
+'''
+Synthetic fixtures so both tools can be run without the production shares:
+    make_envs - crystal report environments (.rpt trees) for every env
+    env_servers - the server each of those environments stands in for
+    make_log - a DLV_Use_Log for the reports in the environments
+    make_forms - scale machine Forms folders full of ticket PDFs
+    slow_fs - adds a delay to every directory listing and stat call to act
+              like an SMB share
+
+Every generator takes a seed, so the same sizes always give the same files.
+'''
+
+# Environments in the order crystal_cleanup walks them, with their servers
+envs = [('Production', 'sal-ssbat-pr01v'), ('Closing', 'sal-ssbat-pr01v'),
+        ('DEV', 'sal-ssbat-dv01v'), ('TEST', 'sal-ssbat-dv01v'),
+        ('QA', 'sal-ssbat-qa01v'), ('SSDEV2', 'sal-ssbat-dv01v')]
+
+# Report folders in each environment
+folders = ['AP Reports', 'AR Reports', 'GL Reports', 'Grain Reports',
+           'Inventory Reports', 'Payroll Reports', 'Scale Reports',
+           'Testing', 'IT SUPPORT']
+
+# Users in the log (the last one is in the excluded users)
+users = ['UAB1234', 'UCD5678', 'UEF9012', 'UGH3456', 'UIJ7890', 'UWL4960']
+
+
+###############################################################################
+def make_envs(root, reports, report_size = 16384, seed = 0):
+    '''
+    Create a .rpt tree for every environment. Production has all the reports
+    and the other environments are copies with some reports missing, changed,
+    copied on another day, or added.
+        Parameters:
+            root: folder to create the environments in
+            reports: number of reports in production
+            report_size: size of each report in bytes
+            seed: seed for the random values
+        Return:
+            env_paths (list): path of each environment (production first)
+    '''
+    rand = random.Random(seed)
+    base_time = time.mktime((2022, 1, 1, 0, 0, 0, 0, 0, -1))
+
+    # Production's reports - (folder, name): (contents, date modified)
+    production = {}
+    for i in range(reports):
+        key = (folders[i % len(folders)], "Rep%06d.rpt" % i)
+        production[key] = (rand.randbytes(report_size),
+                           base_time + rand.randrange(365) * 86400)
+
+    env_paths = []
+    for env, server in envs:
+        env_path = os.path.join(root, server, "smartsoft",
+                                "Crystal Reports - DataLink - " + env) + '/'
+        env_paths.append(env_path.replace('\\', '/'))
+
+        for (folder, name), (contents, mtime) in production.items():
+            roll = rand.random() if env != 'Production' else 1
+
+            # About 5% missing
+            if roll < 0.05:
+                continue
+            # About 5% changed, 3% the same report copied on another day
+            if roll < 0.10:
+                contents = contents[:-1] + bytes([contents[-1] ^ 1])
+                mtime += 86400
+            elif roll < 0.13:
+                mtime += 86400
+
+            path = os.path.join(env_path, folder + " - " + env)
+            os.makedirs(path, exist_ok = True)
+            write_file(os.path.join(path, name), contents, mtime)
+
+        # Added reports and extras in every folder
+        for folder in folders:
+            path = os.path.join(env_path, folder + " - " + env)
+            os.makedirs(os.path.join(path, "old"), exist_ok = True)
+            write_file(os.path.join(path, "Thumbs.db"), b'', base_time)
+            write_file(os.path.join(path, "notes.txt"), b'', base_time)
+            if env != 'Production':
+                write_file(os.path.join(path, env + " Added.rpt"),
+                           rand.randbytes(report_size), base_time)
+
+    return env_paths
+
+
+###############################################################################
+def env_servers(env_paths):
+    '''
+    Get the server each environment from make_envs stands in for. The
+    fixtures are local folders, so crystal_scan.server_name would give every
+    environment the same server (the first folder of the root).
+        Parameters:
+            env_paths: paths returned by make_envs
+        Return:
+            servers (dict): keys:environment paths, values:server names (for
+                            crystal_scan.scan_envs and drift.hash_envs)
+    '''
+    return {env_path: server for env_path, (env, server)
+            in zip(env_paths, envs)}
+
+
+###############################################################################
+def make_log(path, lines, reports, seed = 0, start = dt(2021, 1, 1)):
+    '''
+    Create a DLV_Use_Log with uses of the reports from make_envs, in order of
+    when they were used.
+        Parameters:
+            path: path of the log to create
+            lines: number of lines in the log
+            reports: number of reports in production (same as make_envs)
+            seed: seed for the random values
+            start: date of the first line
+        Return:
+            path (str): the path of the log
+    '''
+    rand = random.Random(seed)
+    # Spread the lines out over two years
+    step = timedelta(days = 730) / max(lines, 1)
+
+    with open(path, 'w', newline = '') as file:
+        for i in range(lines):
+            env = rand.choice(['Production', 'Production', 'Closing', 'DEV'])
+            report = rand.randrange(reports)
+            folder = folders[report % len(folders)]
+            date = start + step * i
+
+            # Timestamps like 3/7/2022 9:05:12 AM
+            stamp = "%d/%d/%d %d:%s" % (date.month, date.day, date.year,
+                                        (date.hour - 1) % 12 + 1,
+                                        date.strftime("%M:%S %p"))
+
+            file.write('"\\\\sal-ssbat-pr01v\\smartsoft\\Crystal Reports - '
+                       'DataLink - %s\\%s - %s\\","Rep%06d.rpt","%s","DLV",'
+                       '"x","%s"\r\n' % (env, folder, env, report,
+                                         rand.choice(users), stamp))
+
+    return path
+
+
+###############################################################################
+def make_forms(root, machines, forms, form_size = 20480, seed = 0):
+    '''
+    Create a Forms folder for each scale machine with ticket PDFs from the
+    last year, named like ONE_Inbound_Ticket_064_0065584_501041_190416_
+    11524526_KXS.PDF.
+        Parameters:
+            root: folder to create the machines in
+            machines: number of machines
+            forms: number of forms on each machine
+            form_size: size of each form in bytes
+            seed: seed for the random values
+        Return:
+            A list of resulting information for the machines:
+                0 - forms_path (str): path to a machine's Forms folder with
+                    {serial} in place of the serial (like ow_variables)
+                1 - registry (list): [location, serial] of each machine
+    '''
+    rand = random.Random(seed)
+    forms_path = os.path.join(root, "{serial}", "Forms").replace('\\', '/')
+    forms_path += '/'
+    today = dt.today()
+    registry = []
+
+    for m in range(machines):
+        loc, serial = "Location %03d" % m, "2UA%07d" % m
+        registry.append([loc, serial])
+        path = forms_path.format(serial = serial)
+        os.makedirs(path, exist_ok = True)
+
+        for ticket in range(forms):
+            date = today - timedelta(days = rand.randrange(1, 365),
+                                     seconds = rand.randrange(86400))
+            name = "ONE_%s_Ticket_%03d_%07d_%06d_%s_%s_%s.PDF" % (
+                rand.choice(['Inbound', 'Outbound']), m % 1000, ticket,
+                rand.randrange(1000000), date.strftime("%y%m%d"),
+                date.strftime("%H%M%S") + "00", rand.choice(['KXS', 'ABC']))
+            write_file(path + name, rand.randbytes(form_size),
+                       date.timestamp())
+
+    return (forms_path, registry)
+
+
+###############################################################################
+def write_file(path, contents, mtime):
+    '''
+    Write a file and set its date modified.
+    '''
+    with open(path, 'wb') as file:
+        file.write(contents)
+    os.utime(path, (mtime, mtime))
+
+
+###############################################################################
+class SlowEntry:
+    '''
+    This class wraps an os.DirEntry so its stat call has a delay.
+    '''
+    def __init__(self, entry, latency):
+        '''
+        Constructor for a SlowEntry.
+        '''
+        self._entry = entry
+        self._latency = latency
+
+    def __getattr__(self, name):
+        return getattr(self._entry, name)
+
+    def __fspath__(self):
+        return self._entry.path
+
+    def stat(self, **kwargs):
+        '''
+        Stat the entry after a delay.
+        '''
+        time.sleep(self._latency)
+        return self._entry.stat(**kwargs)
+
+
+###############################################################################
+@contextmanager
+def slow_fs(latency):
+    '''
+    Add a delay to every directory listing and stat call while in the with
+    block, like the round trip to an SMB share. Sleeping releases the GIL, so
+    threads wait on the "network" at the same time like they would on a share.
+        Parameters:
+            latency: seconds of delay for each call (0 - no delay)
+    '''
+    if not latency:
+        yield
+        return
+
+    real_scandir, real_listdir, real_stat = os.scandir, os.listdir, os.stat
+
+    class SlowScandir:
+        # Listing iterator that wraps every entry
+        def __init__(self, path):
+            time.sleep(latency)
+            self._it = real_scandir(path)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self._it.close()
+
+        def __iter__(self):
+            for entry in self._it:
+                yield SlowEntry(entry, latency)
+
+        def close(self):
+            self._it.close()
+
+    def slow_listdir(path = '.'):
+        time.sleep(latency)
+        return real_listdir(path)
+
+    def slow_stat(path, *args, **kwargs):
+        time.sleep(latency)
+        return real_stat(path, *args, **kwargs)
+
+    os.scandir, os.listdir, os.stat = SlowScandir, slow_listdir, slow_stat
+    try:
+        yield
+    finally:
+        os.scandir, os.listdir, os.stat = real_scandir, real_listdir, real_stat
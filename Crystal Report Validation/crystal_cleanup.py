@@ -1,22 +1,44 @@
 #!/usr/bin/env python3
 # Import helpful libraries
+import argparse
 import os
-from datetime import datetime as dt
-import pandas as pd
+import sys
+from datetime import datetime as dt, timedelta
 
 # Import mods
+import crystal_drift as drift
 import dlv_use as dlv
+import crystal_scan as scan
 import crystal_variables as var
+import inventory_output as output
+from scan_cache import ScanCache
+
+# Import the instrumentation shared with the oneWeigh archive
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                             'Shared'))
+from run_stats import RunStats, profiled
 
 '''
 Creates a Master Inventory Excel file which contains three sheets:
 Inventory - Lists the crystal reports in production and indicates when reports
             are missing or have different dates modified in other environments.
             Additional columns for the last date used and user ID for each
-            crystal report in production and closing.
+            crystal report in production and closing, and how often, by how
+            many users and how long ago it was used (from the usage index).
 Added Reports - Crystal reports found in other environments that are not in the
                 master/production directory.
 Extras - Paths to extra folders and files found in all environments.
+
+With --drift the environments are compared by the contents of the reports
+(see crystal_drift) instead of their dates modified, and "Different Content"
+marks a report that doesn't match production. With --rebuild-usage the whole
+DLV_Use_Log is read again (split between processes) instead of picking up from
+the checkpoint.
+
+Nothing is read or written on import. Use scan_environment/scan.scan_envs and
+dlv.load_usage to gather the data, build_inventory to cross reference it, and
+write_inventory to save the workbook (or CSV/Parquet files), or run main() from
+the command line.
 '''
 
 # Environment paths (production, closing, DEV, TEST, QA)
@@ -24,275 +46,299 @@ production_path = var.production_path
 envs = [var.closing_path, var.dev_path, var.test_path, var.qa_path,
         var.ssdev2_path]
 
-# Excluded folders (according to spec)
-excluded_folders = dlv.excluded_folders
+# Name of the output workbook (same directory as the script)
+inventory_path = 'Crystal Reports Inventory.xlsx'
 
-# List that store paths to extra files and folders
-extra_files = []
-extra_folders = []
-
-# Dictionaries for last used info - keys:report names, values:date - user ID
-c_last_used = []
-p_last_used = []
+# Scan a single environment (see crystal_scan.scan_environment)
+scan_environment = scan.scan_environment
 
 
 ###############################################################################
-def check_excluded(name):
+def diff_envs(master_dict, env_reports, mismatch = "Wrong Date"):
     '''
-    Return if a name should be excluded.
+    Compare every environment to master in one pass over the master reports,
+    using dictionary lookups instead of searching lists.
         Parameters:
-            name: name of a folder to check
+            master_dict: dictionary of the reports in master
+            env_reports: keys:environment names, values:dictionary of the
+                         reports in the env
+            mismatch: what to mark a report whose value doesn't match
         Return:
-            True: the folder should be excluded
-            False otherwise
+            A list of resulting information for the environments:
+                0 - columns (dict): keys:column titles, values:lists of rows
+                    for the inventory (report names, then an env column where
+                    "Missing"/mismatch marks a report that doesn't match)
+                1 - added (dict): keys:environment names, values:sorted list
+                    of the reports in the env but not in master
     '''
-    # Go through the list of excluded folders
-    for folder in excluded_folders:
+    env_names = list(env_reports)
+    env_dicts = [env_reports[name] for name in env_names]
+    tracking = [[] for _ in env_names]
 
-        # True if excluded
-        if folder in name:
-            return True
-        
-    return False
+    # Go through the master reports once, checking every environment
+    for report, date in master_dict.items():
+        for env_dict, col in zip(env_dicts, tracking):
+            env_date = env_dict.get(report)
 
+            # If the report is missing
+            if env_date is None:
+                col.append("Missing")
 
-###############################################################################
-def process_folder(folder, path, reports):
-    '''
-    Returns a dictionary of properly formatted report names within given folder
-    where the keys are report names and values are the report's date modified.
-    Keeps track of anything that is not a crystal report (files and folders).
-        Parameters:
-            folder: current directory to file through
-            path: full path to the directory
-            reports: the dictionary of all the reports in production
-        Return:
-            reports (dict): the dictionary updated with the reports found
-    '''
-    # Raw list of the directories and files within the folder
-    content = os.listdir(path)
+            # If the dates the reports were modified aren't matching
+            elif env_date != date:
+                col.append(mismatch)
 
-    # Go through all the contents of the folder
-    for item in content:
-        # Path to the file/folder
-        full_path = os.path.join(path, item)
-        
-        # If the item is a file
-        if os.path.isfile(full_path):
-            
-            # If item is a crystal report, format and add to the dictionary
-            if item.endswith('.rpt'):
-
-                # Get the datetime modified of the file
-                date = os.path.getmtime(full_path)
-                # Convert the datetime to a formatted string
-                dt_mod = dt.fromtimestamp(date)
-                dt_mod = dt_mod.strftime("%m/%d/%Y")
-
-                # Add the key-value pair into the reports dictionary where
-                # key - report name, value - date modified
-                reports[dlv.format_report_name(folder, item)] = dt_mod
-
-            # If the item is not a .db, add to list of extra files
-            elif not item.endswith('.db'):
-                extra_files.append(full_path)
-
-        # If it's a directory
-        elif os.path.isdir(full_path):
-            # Add to list of extra folders
-            extra_folders.append(full_path)
-            
-    return reports
+            # If everything lines up/matches, add a blank row
+            else:
+                col.append("")
 
+    columns = {'Report Folder - Report Name': list(master_dict)}
+    columns.update(zip(env_names, tracking))
 
-###############################################################################
-def process_env(env_path):
-    '''
-    Returns a dictionary of all the reports in an environment.
-        Parameters:
-            env_path: path of the environment to process
-        Return:
-            reports_dict: the dictionary of all reports located in the env
-    '''
-    reports_dict = {}
-    
-    # Contents of the environment folder
-    env_contents = os.listdir(env_path)
+    # Reports in each env but not in master (key set difference)
+    added = {name: sorted(env_dict.keys() - master_dict.keys())
+             for name, env_dict in zip(env_names, env_dicts)}
 
-    # Go through all items in environment
-    for item in env_contents:
+    return (columns, added)
 
-        # Get the full path to the current item
-        item_path = env_path + item
-        
-        # If the item is a directory
-        if os.path.isdir(item_path) and not check_excluded(item):
-            reports_dict = process_folder(item, item_path, reports_dict)
-
-    return reports_dict
-        
 
 ###############################################################################
-def make_df(dictionary):
+def check_dict(report, dictionary, col):
     '''
-    Convert a dictonary with varying column lengths to a dataframe.
+    Check if a report is a key in a dictionary and add the corresponding value
+    to the col list if it is.
         Parameters:
-            dictionary: represents column titles with lists of rows
+            report: a string report name
+            dictionary: dictionary with report names as keys
+            col: a list that represents the column that will be in the excel
         Return:
-            The dictionary converted to a dataframe
+            col (list): the updated col list
     '''
-    return pd.DataFrame({k:pd.Series(v) for k,v in dictionary.items()})
+    # If the report has a last used entry in the dictionary
+    if report in dictionary:        
+        # Add its information to the column
+        col.append(dictionary[report][0])
+        
+    else:
+        # Add a blank
+        col.append("")
+
+    return col
 
 
 ###############################################################################
-def find_diff(list1, list2):
+def usage_columns(reports, usage_index, today = None,
+                  window_days = var.usage_window_days):
     '''
-    Returns the difference between two lists.
+    Create the usage frequency and staleness columns from the usage index,
+    combining production and closing.
         Parameters:
-            list1: guide/original list
-            list2: list to check for missing items
+            reports: the report names, in inventory order
+            usage_index: UsageIndex (from dlv.load_usage)
+            today: date the staleness is measured from (defaults to today)
+            window_days: number of days the uses are counted over
         Return:
-            list of items in list1 that are missing in list2
+            columns (dict): keys:column titles, values:lists of rows (None
+                            for reports that were never used, so the columns
+                            stay numeric)
     '''
-    return sorted(list(set(list1).difference(list2)))
+    if today is None:
+        today = dt.today()
+    start = today - timedelta(days = window_days - 1)
 
+    uses_title = 'Uses - Last ' + str(window_days) + ' Days'
+    columns = {uses_title: [], 'Distinct Users': [], 'Days Since Last Use': []}
 
-###############################################################################
-def track_diff(report_dict):
-    '''
-    Create a list to track reports in master that are missing in an environment.
-        Parameters:
-            report_dict: dictionary of reports to compare with master
-        Return:
-            tracking (list): a list where X represents a missing report
-    '''
-    # Get the list of report names from the dictionary
-    report_list = report_dict.keys()
-    # Get a list of reports that are in master but missing in the env list
-    env_missing = find_diff(master_list, report_list)
-    # List of tracking info for the environment comparison
-    tracking = []
-    
-    # Go through the master reports
-    for report in master_list:
-        
-        # If the report is missing
-        if report in env_missing:
-            tracking.append("Missing")
+    for report in reports:
+        history = [usage for usage in (usage_index.get('Production', report),
+                                       usage_index.get('Closing', report))
+                   if usage is not None]
 
-        # If the dates the reports were modified aren't matching
-        elif master_dict[report] != report_dict[report]:
-            tracking.append("Wrong Date")
-            
-        # If everything lines up/matches, add a blank row
-        else:
-            tracking.append("")
+        # Never used - left blank (written as an empty cell)
+        if not history:
+            for col in columns.values():
+                col.append(None)
+            continue
 
-    return tracking
+        last = max(usage.last for usage in history)
+        columns[uses_title].append(sum(usage.hits_between(start, today)
+                                       for usage in history))
+        columns['Distinct Users'].append(len(set().union(
+            *(usage.users for usage in history))))
+        columns['Days Since Last Use'].append(
+            (today.date() - last.date()).days)
+
+    return columns
 
 
 ###############################################################################
-def compare_env(env_path):
+def build_inventory(env_reports, extras, cl_usage, prod_usage,
+                    master_name = 'Production', usage_index = None,
+                    today = None, fingerprints = None):
     '''
-    Compare the reports in an environment to the master reports list.
+    Create the master inventory and check the other environments against it.
         Parameters:
-            env_path: path to the environment that is being checked
+            env_reports: keys:environment names, values:dictionary of the
+                         reports in the env (from scan.scan_envs)
+            extras: Extras store of the extra files and folders
+            cl_usage: closing usage dictionary (from dlv.load_usage)
+            prod_usage: production usage dictionary (from dlv.load_usage)
+            master_name: name of the environment to use as the master
+            usage_index: UsageIndex (from dlv.load_usage) for the usage
+                         frequency and staleness columns (None - leave them
+                         out)
+            today: date the staleness is measured from (defaults to today)
+            fingerprints: keys:environment names, values:dictionary of the
+                          reports' content fingerprints (from
+                          drift.hash_envs) to compare instead of the dates
         Return:
-            A list of resulting information for the environment:
-                0 - env_missing: reports in master but not in the env
-                1 - env_added: reports in the env but not in master
+            sheets (dict): keys:sheet names (Inventory, Added Reports,
+                           Extras), values:dictionary of column titles with
+                           lists of rows
     '''
-    # Get dictionary of files in the environment
-    env_dict = process_env(env_path)
-    # Get the reports in master but not in the env
-    env_missing = track_diff(env_dict)
-    # Get the reports in the env but not in master
-    env_added = find_diff(env_dict.keys(), master_list)
-
-    return (env_missing, env_added)
+    # Compare the contents of the reports instead of their dates
+    mismatch = "Wrong Date"
+    if fingerprints is not None:
+        env_reports = fingerprints
+        mismatch = "Different Content"
+
+    # Dictionary of reports in production, which will be the master
+    master_dict = env_reports[master_name]
+    # All the other environments
+    other_reports = {name: reports for name, reports in env_reports.items()
+                     if name != master_name}
+
+    # Lists for last used info - date - user ID
+    c_last_used = []
+    p_last_used = []
+
+    # Fill the last used lists based on the dlv usage information
+    for report in master_dict:
+        c_last_used = check_dict(report, cl_usage, c_last_used)
+        p_last_used = check_dict(report, prod_usage, p_last_used)
+
+    # Master reports with the results of comparing to other environments
+    master_inventory, added_reports_dict = diff_envs(master_dict,
+                                                     other_reports, mismatch)
+    # Add last used information
+    master_inventory['Last Used SSCLOSE Date - User'] = c_last_used
+    master_inventory['Last Used SSPROD Date - User'] = p_last_used
+
+    # Add how often and how recently the reports are used
+    if usage_index is not None:
+        master_inventory.update(usage_columns(master_dict, usage_index, today))
+
+    return {'Inventory': master_inventory,
+            'Added Reports': added_reports_dict,
+            'Extras': {'Folders': extras.folders, 'Files': extras.files}}
 
 
 ###############################################################################
-def check_dict(report, dictionary, col):
+def write_inventory(path, sheets, output_format = 'xlsx'):
     '''
-    Check if a report is a key in a dictionary and add the corresponding value
-    to the col list if it is.
+    Write the inventory sheets, streaming the rows into the output.
         Parameters:
-            report: a string report name
-            dictionary: dictionary with report names as keys
-            col: a list that represents the column that will be in the excel
-        Return:
-            col (list): the updated col list
+            path: path of the Excel file to create (CSV and Parquet files are
+                  named after it with the sheet name added)
+            sheets: dictionary of sheet names with their columns (from
+                    build_inventory)
+            output_format: 'xlsx', 'csv' or 'parquet'
     '''
-    # If the report has a last used entry in the dictionary
-    if report in dictionary:        
-        # Add its information to the column
-        col.append(dictionary[report][0])
-        
-    else:
-        # Add a blank
-        col.append("")
-
-    return col
+    output.writers[output_format](path, sheets)
 
 
 ###############################################################################
-def check_envs(master_inventory):
+def main(argv = None):
     '''
-    Cross reference master with all other environments to create the master
-    inventory and lists of added reports.
+    Create the Crystal Reports Inventory Excel file from the command line.
         Parameters:
-            master_inventory: the dictionary to store the results in
-        Return:
-            master_inventory: updated master inventory dictionary
+            argv: command line arguments (defaults to sys.argv)
     '''
-    # For each environment
-    for env in envs:
-
-        # Get the current environment's name
-        env_name = env.split('/')[4].split(' - ')[2]
-        # Compare the environment to the master
-        env_results = compare_env(env)
-        
-        # Update the master and added reports with the results
-        master_inventory[env_name] = env_results[0]
-        added_reports_dict[env_name] = env_results[1]
-        
-    return master_inventory
-
-        
-###############################################################################
-""" Create the master inventory and check other environments """
-# Dictionary of reports in production, which will be the master
-master_dict = process_env(production_path)
-# List of master report names
-master_list = master_dict.keys()
-
-# Fill the last used lists based on the dlv usage information
-for report in master_list:
-    c_last_used = check_dict(report, dlv.cl_usage, c_last_used)
-    p_last_used = check_dict(report, dlv.prod_usage, p_last_used)
-
-added_reports_dict = {}
-# Add the master reports to the inventory dictonary
-master_inventory = {'Report Folder - Report Name': master_list}
-# Add results of comparing to other environments
-master_inventory = check_envs(master_inventory)
-# Add last used information
-master_inventory['Last Used SSCLOSE Date - User'] = c_last_used
-master_inventory['Last Used SSPROD Date - User'] = p_last_used
-
-# Convert dictionaries to dataframes (make_df for columns with diff lengths)
-master_df = pd.DataFrame(master_inventory)
-added_reports_df = make_df(added_reports_dict)
-extras_df = make_df({'Folders': extra_folders, 'Files': extra_files})
-
-# Create a writer for the excel file and add the dataframes as sheets
-writer = pd.ExcelWriter('Crystal Reports Inventory.xlsx', engine = 'openpyxl')
-master_df.to_excel(writer, 'Inventory', index = False)
-added_reports_df.to_excel(writer, 'Added Reports', index = False)
-extras_df.to_excel(writer, 'Extras', index = False)
-
-# Save/close the excel sheet (same directory as the script)
-writer.save()
-
+    # Command line options
+    parser = argparse.ArgumentParser(description = "Create the Crystal Reports "
+                                     "Inventory Excel file.")
+    parser.add_argument('--full', action = 'store_true',
+                        help = "rescan every folder and rebuild the scan cache")
+    parser.add_argument('--rebuild-usage', action = 'store_true',
+                        help = "read the whole DLV_Use_Log again (in parallel) "
+                               "instead of picking up from the checkpoint")
+    parser.add_argument('--drift', action = 'store_true',
+                        help = "compare the contents of the reports instead of "
+                               "their dates modified")
+    parser.add_argument('--format', choices = sorted(output.writers),
+                        default = 'xlsx',
+                        help = "output format (csv and parquet write one file "
+                               "per sheet)")
+    parser.add_argument('--stats', default = var.run_stats_path,
+                        help = "JSON file to write the run summary to")
+    parser.add_argument('--profile', metavar = 'PATH', default = None,
+                        help = "profile the run with cProfile and save the "
+                               "stats to PATH")
+    args = parser.parse_args(argv)
+
+    # Time of each stage and counters for each environment
+    run_stats = RunStats('crystal_cleanup')
+
+    with profiled(args.profile):
+        # Scan cache from the last run - cleared for a full rebuild
+        cache = ScanCache(var.scan_cache_path)
+        if args.full:
+            cache.clear()
+
+        # Walk production and all the other environments at once (keeping
+        # the report files found for drift detection)
+        env_files = {} if args.drift else None
+        with run_stats.stage('scan'):
+            env_reports, extras, env_stats = scan.scan_envs(
+                [production_path] + envs, cache = cache, files = env_files)
+
+        # Fingerprint the contents of every report
+        fingerprints = None
+        if args.drift:
+            with run_stats.stage('drift'):
+                fingerprints, hash_stats = drift.hash_envs(env_files, cache)
+
+            for name, stats in hash_stats.items():
+                print(name + " - reports fingerprinted: " + str(stats.reports) +
+                      ", hashed: " + str(stats.hashed) + " (" +
+                      str(stats.bytes_hashed) + " bytes), cached: " +
+                      str(stats.cached))
+                run_stats.count(name, hashed = stats.hashed,
+                                bytes_hashed = stats.bytes_hashed,
+                                hashes_cached = stats.cached)
+        cache.close()
+
+        # Show the file system calls each environment needed
+        for name, stats in env_stats.items():
+            print(name + " - directories listed: " + str(stats.listings) +
+                  ", stat calls: " + str(stats.stat_calls) +
+                  " (listdir walk: " + str(stats.legacy_calls) +
+                  "), folders reused from the cache (still listed): " +
+                  str(stats.reused_folders))
+            run_stats.count(name, reports = len(env_reports[name]),
+                            listings = stats.listings,
+                            stat_calls = stats.stat_calls,
+                            reused_folders = stats.reused_folders)
+
+        # Last used information from the DLV Use Log
+        with run_stats.stage('parse'):
+            cl_usage, prod_usage, usage_index = dlv.load_usage(
+                var.log_path, rebuild = args.rebuild_usage)
+        run_stats.count('DLV_Use_Log', entries = dlv.date_parser.fast_path +
+                        dlv.date_parser.slow_path,
+                        slow_dates = dlv.date_parser.slow_path)
+
+        # Cross reference the environments and save the workbook
+        with run_stats.stage('diff'):
+            sheets = build_inventory(env_reports, extras, cl_usage,
+                                     prod_usage,
+                                     scan.env_name(production_path),
+                                     usage_index, fingerprints = fingerprints)
+        with run_stats.stage('write'):
+            write_inventory(inventory_path, sheets, args.format)
+
+    # Save the run summary
+    run_stats.write(args.stats)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# Import libraries
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Import mods
+import crystal_scan as scan
+import crystal_variables as var
+
+'''
+Content drift detection for the crystal reports. Comparing the dates modified
+flags identical reports that were copied on different days and misses reports
+that changed on the same day, so instead every report is fingerprinted with a
+streaming hash of its contents and the fingerprints are compared.
+
+The reports to hash (with their size and date modified) come from the folder
+listings scan.scan_envs already made (folders reused from the scan cache are
+listed too), so drift detection doesn't list anything again. Hashing reads
+every report over the network, so the fingerprints are kept in the scan cache
+by path, size and date modified and a report is only read again after it
+changes. The reports are hashed on a bounded thread pool with the same
+per-server limit as the scan.
+'''
+
+# Bytes read from a report at a time
+chunk_size = 1024 * 1024
+
+
+###############################################################################
+class HashStats:
+    '''
+    This class counts the work done fingerprinting an environment.
+
+    Attributes:
+        reports (int): number of reports fingerprinted
+        hashed (int): reports that were read and hashed
+        cached (int): reports whose fingerprint came from the scan cache
+        bytes_hashed (int): bytes read to hash the reports
+    '''
+    def __init__(self):
+        '''
+        Constructor for HashStats with all the counts at zero.
+        '''
+        self.reports = 0
+        self.hashed = 0
+        self.cached = 0
+        self.bytes_hashed = 0
+        self._lock = threading.Lock()
+
+    def add_hashed(self, size):
+        '''
+        Count a report that was read and hashed.
+        '''
+        with self._lock:
+            self.hashed += 1
+            self.bytes_hashed += size
+
+
+###############################################################################
+def file_hash(path):
+    '''
+    Get the fingerprint of a file, reading it in chunks.
+        Parameters:
+            path: path to the file
+        Return:
+            The hex digest of the file's contents
+    '''
+    digest = hashlib.blake2b(digest_size = 16)
+
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+###############################################################################
+def hash_envs(env_files, cache = None, max_workers = var.max_workers,
+              server_workers = var.server_workers, servers = None):
+    '''
+    Fingerprint the reports in all of the environments at once. The reports
+    that aren't in the cache are hashed on the thread pool, and the results
+    are put back together in walk order so they line up with scan.scan_envs.
+        Parameters:
+            env_files: keys:environment paths, values:dictionary where
+                       keys:report names, values:(path, size, date modified)
+                       (filled in by scan.scan_envs)
+            cache: optional ScanCache to get and store the fingerprints in
+            max_workers: total number of threads reading the shares
+            server_workers: number of threads allowed on one server at once
+            servers: optional dictionary of keys:environment paths,
+                     values:server names (None - from the UNC paths)
+        Return:
+            env_hashes (dict): keys:environment names, values:dictionary
+                               where keys:report names, values:fingerprints
+            env_stats (dict): keys:environment names, values:HashStats
+    '''
+    env_stats = {scan.env_name(env): HashStats() for env in env_files}
+
+    def hash_job(env, path, size):
+        # Read and hash one report
+        digest = file_hash(path)
+        env_stats[scan.env_name(env)].add_hashed(size)
+        return digest
+
+    with ThreadPoolExecutor(max_workers = max_workers) as pool:
+        limits = scan.ServerLimits(pool, env_files, server_workers, servers)
+
+        # Queue a hash for every report that isn't in the cache
+        jobs = {}
+        for env, reports in env_files.items():
+            stats = env_stats[scan.env_name(env)]
+            jobs[env] = []
+
+            for name, (path, size, mtime) in reports.items():
+                digest = None
+                if cache is not None:
+                    digest = cache.get_hash(path, size, mtime)
+
+                if digest is None:
+                    job = limits.submit(env, hash_job, env, path, size)
+                else:
+                    job = digest
+                    stats.cached += 1
+
+                stats.reports += 1
+                jobs[env].append((name, path, size, mtime, job))
+
+        # Put the fingerprints back together in walk order
+        env_hashes = {}
+        for env in env_files:
+            hashes = {}
+            new_hashes = []
+
+            for name, path, size, mtime, job in jobs[env]:
+                if not isinstance(job, str):
+                    job = job.result()
+                    new_hashes.append((path, size, mtime, job))
+                hashes[name] = job
+
+            if cache is not None:
+                cache.put_hashes(new_hashes)
+            env_hashes[scan.env_name(env)] = hashes
+
+    return (env_hashes, env_stats)
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+# Import libraries
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime as dt
+
+# Import mods
+import dlv_use as dlv
+import crystal_variables as var
+
+# Import the scheduling shared with the oneWeigh archive
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                             'Shared'))
+from job_slots import SlotQueue
+
+'''
+Scan engine that walks all of the crystal report environments at once. Every
+environment is a share on one of the batch servers, so the folders are walked
+on a bounded thread pool with a limit on how many jobs can be working on the
+same server at a time. Each server's jobs wait in their own queue until the
+server has a free slot, so a busy server doesn't hold up the pool. Folders are
+read with os.scandir so the type and date modified of each item come from the
+listing instead of separate stat calls. Every folder is listed on every run;
+the scan cache only saves processing a folder whose reports haven't changed.
+'''
+
+# Excluded folders (according to spec)
+excluded_folders = dlv.excluded_folders
+
+# True when DirEntry.stat() is answered from the directory listing (Windows)
+cached_stat = os.name == 'nt'
+
+
+###############################################################################
+class Extras:
+    '''
+    This class is a thread-safe store of the paths to extra files and folders
+    found while scanning the environments.
+
+    Attributes:
+        files (list): paths to files that are not crystal reports
+        folders (list): paths to folders inside of the report folders
+    '''
+    def __init__(self):
+        '''
+        Constructor for an empty Extras store.
+        '''
+        self.files = []
+        self.folders = []
+        self._lock = threading.Lock()
+
+    def add_file(self, path):
+        '''
+        Add the path of an extra file.
+        '''
+        with self._lock:
+            self.files.append(path)
+
+    def add_folder(self, path):
+        '''
+        Add the path of an extra folder.
+        '''
+        with self._lock:
+            self.folders.append(path)
+
+    def extend(self, other):
+        '''
+        Add all of the paths stored in another Extras store.
+        '''
+        with self._lock:
+            self.files.extend(other.files)
+            self.folders.extend(other.folders)
+
+
+###############################################################################
+class WalkStats:
+    '''
+    This class counts the file system calls made while walking an environment.
+    Every call is a network round trip when the environment is on a share.
+
+    Attributes:
+        listings (int): number of directories listed
+        stat_calls (int): stat calls made outside of the directory listings
+        legacy_calls (int): isfile/isdir/getmtime calls the listdir walk
+                            would have made for the same directories
+        reused_folders (int): report folders that were still listed, but
+                              whose reports and extras were reused from the
+                              scan cache instead of processed again
+    '''
+    def __init__(self):
+        '''
+        Constructor for WalkStats with all the counts at zero.
+        '''
+        self.listings = 0
+        self.stat_calls = 0
+        self.legacy_calls = 0
+        self.reused_folders = 0
+
+    def add(self, other):
+        '''
+        Add the counts from another WalkStats.
+        '''
+        self.listings += other.listings
+        self.stat_calls += other.stat_calls
+        self.legacy_calls += other.legacy_calls
+        self.reused_folders += other.reused_folders
+
+
+###############################################################################
+class ServerLimits:
+    '''
+    This class limits how many jobs can be working on the same server at
+    once, so a single server isn't flooded. Jobs wait in their server's queue
+    instead of holding a pool thread, so the other servers' jobs keep running.
+
+    Attributes:
+        servers (dict): keys:environment paths, values:server names
+        queues (dict): keys:server names, values:SlotQueue on the pool
+    '''
+    def __init__(self, pool, env_paths, server_workers = var.server_workers,
+                 servers = None):
+        '''
+        Constructor for ServerLimits with one queue per server.
+            Parameters:
+                pool: thread pool the jobs are run on
+                env_paths: paths of the environments that will be read
+                server_workers: number of jobs allowed on one server
+                servers: optional dictionary of keys:environment paths,
+                         values:server names (None - from the UNC paths)
+        '''
+        self.servers = {}
+        self.queues = {}
+        for env in env_paths:
+            server = servers[env] if servers else server_name(env)
+            self.servers[env] = server
+            if server not in self.queues:
+                self.queues[server] = SlotQueue(pool, server_workers)
+
+    def submit(self, env, func, *args):
+        '''
+        Queue a job to run once the environment's server has a free slot.
+            Parameters:
+                env: path of the environment the job reads
+                func: function to run
+                args: arguments for func
+            Return:
+                A Future for what func returns
+        '''
+        return self.queues[self.servers[env]].submit(func, *args)
+
+
+###############################################################################
+def check_excluded(name):
+    '''
+    Return if a name should be excluded.
+        Parameters:
+            name: name of a folder to check
+        Return:
+            True: the folder should be excluded
+            False otherwise
+    '''
+    # Go through the list of excluded folders
+    for folder in excluded_folders:
+
+        # True if excluded
+        if folder in name:
+            return True
+
+    return False
+
+
+###############################################################################
+def env_name(env_path):
+    '''
+    Get the name of an environment from its path.
+        Parameters:
+            env_path: path of the environment (the last folder is named
+                      "Crystal Reports - DataLink - <env>")
+        Return:
+            The environment name (ex. "Production", "DEV")
+    '''
+    return env_path.rstrip('/').split('/')[-1].split(' - ')[2]
+
+
+###############################################################################
+def server_name(env_path):
+    '''
+    Get the name of the server an environment is shared from.
+        Parameters:
+            env_path: UNC path of the environment
+        Return:
+            The server name in lowercase (ex. "sal-ssbat-dv01v")
+    '''
+    return env_path.lstrip('/').split('/')[0].lower()
+
+
+###############################################################################
+def entry_stat(entry, stats):
+    '''
+    Get the stat data of a directory entry.
+        Parameters:
+            entry: os.DirEntry of a file
+            stats: WalkStats to count the stat call in
+        Return:
+            The entry's os.stat_result
+    '''
+    # Windows fills in the stat data from the directory listing itself
+    if not cached_stat:
+        stats.stat_calls += 1
+
+    return entry.stat()
+
+
+###############################################################################
+def report_files(path, stats):
+    '''
+    Get the size and date modified of every crystal report in a folder from
+    one listing (to check a cached folder against).
+        Parameters:
+            path: full path to the directory
+            stats: WalkStats to count the file system calls in
+        Return:
+            files (dict): keys:report file names, values:(size, date
+                          modified timestamp)
+    '''
+    files = {}
+    stats.listings += 1
+
+    with os.scandir(path) as content:
+        for item in content:
+            if item.name.endswith('.rpt') and item.is_file():
+                item_stat = entry_stat(item, stats)
+                files[item.name] = (item_stat.st_size, item_stat.st_mtime)
+
+    return files
+
+
+###############################################################################
+def process_folder(folder, path, reports, extras, stats, files = None):
+    '''
+    Returns a dictionary of properly formatted report names within given folder
+    where the keys are report names and values are the report's date modified.
+    Keeps track of anything that is not a crystal report (files and folders).
+        Parameters:
+            folder: current directory to file through
+            path: full path to the directory
+            reports: the dictionary of all the reports in production
+            extras: Extras store for files and folders that aren't reports
+            stats: WalkStats to count the file system calls in
+            files: optional dictionary to fill with each report file's
+                   (size, date modified timestamp) for the scan cache
+        Return:
+            reports (dict): the dictionary updated with the reports found
+    '''
+    stats.listings += 1
+
+    # Go through all the contents of the folder in one listing
+    with os.scandir(path) as content:
+        for item in content:
+            # The listdir walk needed an isfile call for every item
+            stats.legacy_calls += 1
+
+            # If the item is a file
+            if item.is_file():
+
+                # If item is a crystal report, format and add to the dictionary
+                if item.name.endswith('.rpt'):
+                    # The listdir walk needed a getmtime call for the report
+                    stats.legacy_calls += 1
+
+                    # Add the key-value pair into the reports dictionary where
+                    # key - report name, value - date modified
+                    item_stat = entry_stat(item, stats)
+                    reports[dlv.format_report_name(folder, item.name)] = \
+                        dt.fromtimestamp(item_stat.st_mtime).strftime(
+                            "%m/%d/%Y")
+
+                    if files is not None:
+                        files[item.name] = (item_stat.st_size,
+                                            item_stat.st_mtime)
+
+                # If the item is not a .db, add to list of extra files
+                elif not item.name.endswith('.db'):
+                    extras.add_file(item.path)
+
+            else:
+                # The listdir walk needed an isdir call for anything else
+                stats.legacy_calls += 1
+
+                # If it's a directory, add to list of extra folders
+                if item.is_dir():
+                    extras.add_folder(item.path)
+
+    return reports
+
+
+###############################################################################
+def list_env(env_path, stats, mtimes = None):
+    '''
+    Returns the report folders at the top level of an environment.
+        Parameters:
+            env_path: path of the environment to list
+            stats: WalkStats to count the file system calls in
+            mtimes: optional dictionary to fill with each folder's date
+                    modified (timestamp) for the scan cache
+        Return:
+            folders (list): names of the folders that aren't excluded
+    '''
+    folders = []
+    stats.listings += 1
+
+    # Go through all items in environment
+    with os.scandir(env_path) as content:
+        for item in content:
+            # The listdir walk needed an isdir call for every item
+            stats.legacy_calls += 1
+
+            # If the item is a directory
+            if item.is_dir() and not check_excluded(item.name):
+                folders.append(item.name)
+
+                # Keep the folder's date modified to check against the cache
+                if mtimes is not None:
+                    if not cached_stat:
+                        stats.stat_calls += 1
+                    mtimes[item.name] = item.stat().st_mtime
+
+    return folders
+
+
+###############################################################################
+def process_env(env_path, extras, stats):
+    '''
+    Returns a dictionary of all the reports in an environment.
+        Parameters:
+            env_path: path of the environment to process
+            extras: Extras store for files and folders that aren't reports
+            stats: WalkStats to count the file system calls in
+        Return:
+            reports_dict: the dictionary of all reports located in the env
+    '''
+    reports_dict = {}
+
+    # Go through all the report folders in the environment
+    for item in list_env(env_path, stats):
+        reports_dict = process_folder(item, env_path + item, reports_dict,
+                                      extras, stats)
+
+    return reports_dict
+
+
+###############################################################################
+def scan_envs(env_paths, max_workers = var.max_workers,
+              server_workers = var.server_workers, cache = None,
+              files = None, servers = None):
+    '''
+    Walk all of the environments at once and return their report dictionaries.
+    The top level of every environment is listed first, then each report
+    folder is processed as its own job. Results are put back together in the
+    same order a one-at-a-time walk would give. With a scan cache, a folder
+    whose date modified hasn't changed is still listed once to check the size
+    and date modified of its reports (a report overwritten in place doesn't
+    change the folder's date modified), and its reports and extras are reused
+    from the cache if none of them changed. The cache saves processing the
+    folder again, not the listing - every folder costs one listing either way.
+        Parameters:
+            env_paths: paths of the environments to process
+            max_workers: total number of threads walking the shares
+            server_workers: number of threads allowed on one server at once
+            cache: optional ScanCache of the folders from the last run
+            files: optional dictionary to fill with keys:environment paths,
+                   values:dictionary where keys:report names, values:(path,
+                   size, date modified timestamp) of the report file, in
+                   walk order (for drift.hash_envs)
+            servers: optional dictionary of keys:environment paths,
+                     values:server names (None - from the UNC paths)
+        Return:
+            env_reports (dict): keys:environment names, values:the dictionary
+                                of all reports located in the env
+            extras (Extras): extra files and folders found in every env
+            env_stats (dict): keys:environment names, values:WalkStats of
+                              the file system calls made in the env
+    '''
+    def list_job(env):
+        # List the top level of an environment and count the calls made
+        stats = WalkStats()
+        mtimes = {} if cache is not None else None
+        return (list_env(env, stats, mtimes), stats, mtimes)
+
+    def folder_job(env, folder, mtime):
+        # Process a report folder into its own reports, extras, counts and
+        # report files, and whether it was scanned (False - from the cache)
+        folder_extras = Extras()
+        stats = WalkStats()
+
+        # Use the folder from the cache if none of its reports changed
+        if cache is not None:
+            cached = cache.get(env, folder, mtime)
+            if cached is not None:
+                listed = report_files(env + folder, stats)
+                if listed == cached[3]:
+                    folder_extras.files, folder_extras.folders = cached[1:3]
+                    stats.reused_folders += 1
+                    return (cached[0], folder_extras, stats, listed, False)
+
+        listed = {}
+        reports = process_folder(folder, env + folder, {}, folder_extras,
+                                 stats, listed)
+        return (reports, folder_extras, stats, listed, True)
+
+    with ThreadPoolExecutor(max_workers = max_workers) as pool:
+        limits = ServerLimits(pool, env_paths, server_workers, servers)
+
+        # List the top level of every environment
+        listings = {limits.submit(env, list_job, env): env
+                    for env in env_paths}
+
+        # Queue a job for every report folder as soon as its env is listed
+        jobs = {}
+        list_stats = {}
+        env_mtimes = {}
+        for listing in as_completed(listings):
+            env = listings[listing]
+            folders, list_stats[env], env_mtimes[env] = listing.result()
+            jobs[env] = []
+
+            for folder in folders:
+                mtime = env_mtimes[env][folder] if cache is not None else None
+                jobs[env].append((folder, limits.submit(env, folder_job, env,
+                                                        folder, mtime)))
+
+            # Forget folders that were removed from the environment
+            if cache is not None:
+                cache.prune(env, folders)
+
+        # Put the results back together in walk order
+        env_reports = {}
+        env_stats = {}
+        extras = Extras()
+        for env in env_paths:
+            reports_dict = {}
+            env_stats[env_name(env)] = list_stats[env]
+            if files is not None:
+                files[env] = {}
+
+            for folder, job in jobs[env]:
+                reports, folder_extras, stats, listed, scanned = job.result()
+
+                # Store the folders that were scanned in the cache
+                if cache is not None and scanned:
+                    cache.put(env, folder, env_mtimes[env][folder], reports,
+                              folder_extras.files, folder_extras.folders,
+                              listed)
+
+                # Keep each report's file in the same order as the reports
+                if files is not None:
+                    paths = {dlv.format_report_name(folder, name):
+                             (os.path.join(env + folder, name), size, mtime)
+                             for name, (size, mtime) in listed.items()}
+                    files[env].update((report, paths[report])
+                                      for report in reports)
+
+                reports_dict.update(reports)
+                extras.extend(folder_extras)
+                env_stats[env_name(env)].add(stats)
+
+            env_reports[env_name(env)] = reports_dict
+
+    return (env_reports, extras, env_stats)
+
+
+###############################################################################
+def scan_environment(env_path, cache = None):
+    '''
+    Walk a single environment and return its reports.
+        Parameters:
+            env_path: path of the environment to process
+            cache: optional ScanCache of the folders from the last run
+        Return:
+            A list of resulting information for the environment:
+                0 - reports_dict: the dictionary of all reports in the env
+                1 - extras (Extras): extra files and folders found in the env
+                2 - stats (WalkStats): file system calls made in the env
+    '''
+    env_reports, extras, env_stats = scan_envs([env_path], cache = cache)
+    name = env_name(env_path)
+
+    return (env_reports[name], extras, env_stats[name])
@@ -12,3 +12,20 @@ log_path = "//sal-ssbat-pr01v/smartsoft/Crystal Reports - DataLink - Production/
 # Exclusions
 excluded_users = ["UWL4960", "UBJ0034", "UVP3825", "UEC5074", "UTD0173", "UTN7584"]
 excluded_folders = ['Testing', 'IT SUPPORT']
+
+# Scan engine limits
+max_workers = 8 # Total threads walking the environments at once
+server_workers = 3 # Threads allowed on the same server at once
+
+# Scan cache of the report folders (same directory as the script)
+scan_cache_path = "crystal_scan_cache.db"
+
+# Checkpoint of the DLV_Use_Log usage (same directory as the script)
+usage_checkpoint_path = "dlv_use_checkpoint.json"
+usage_workers = None # Processes reading the whole log on a rebuild (None - one per core)
+
+# Window for the usage frequency column of the inventory
+usage_window_days = 365 # Uses counted over the last year
+
+# Summary of the stage times and counters of each run (same directory as the script)
+run_stats_path = "crystal_run_stats.json"
@@ -1,25 +1,66 @@
 #!/usr/bin/env python3
 # Import libraries
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime as dt
-from dateutil.parser import parse
+import hashlib
+import json
+import locale
+import mmap
 import os
+import sys
 import crystal_variables as var
+from log_dates import DateParser
+from usage_index import UsageIndex
+
+# Import the JSON writing shared with the oneWeigh archive
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                             'Shared'))
+from json_files import write_json
 
 '''
 Process the DLV_Use_Log to create dictionaries for production and closing with
 report names as keys and the last used date, user ID, and datetime as values.
+The log only grows, so the dictionaries are saved to a checkpoint file along
+with the byte offset that was read up to and a fingerprint of the log (the
+start of the log and the bytes right before the offset). The next run only
+reads the lines that were added to the log since then, or starts over if the
+fingerprint shows the log was replaced or the excluded users or folders were
+changed since the checkpoint was saved.
+
+The checkpoint also holds a UsageIndex with the usage history of every report
+(hits per day, distinct users, first and last use), which is updated with the
+same new lines.
+
+A full rebuild (no checkpoint yet, or --rebuild-usage) of a large log is
+split into byte ranges that end on a line break, and the ranges are parsed in
+separate processes. Each range gives partial dictionaries and a partial usage
+index, which are merged in the order of the ranges with the same rules as
+update_dictionary, so the result is the same as reading the log in one pass.
+
+Nothing is read on import - call load_usage to get the dictionaries.
 '''
 # Initialize variables
 log_path = var.log_path
 #log_path = "C:/Users/umh2699/AppData/Local/Programs/Python/Python310/Scripts/practice_log.txt"
+checkpoint_path = var.usage_checkpoint_path
 excluded_users = var.excluded_users
 excluded_folders = var.excluded_folders
+usage_workers = var.usage_workers
 
-# Last used dictionaries - keys:report names, values:date - user ID, datetime
-cl_usage = {}
-prod_usage = {}
-# List of entries in the DLV Use Log
-entries = []
+# A log range smaller than this isn't worth a separate process
+min_range_size = 4 * 1024 * 1024
+# Ranges for each process (more ranges than processes evens out the work)
+ranges_per_worker = 4
+# Bytes at the start of the log and before the offset in its fingerprint
+fingerprint_size = 4096
+
+# Encoding the log is read with (same as opening it in text mode)
+log_encoding = locale.getpreferredencoding(False)
+
+# Parser for the log's timestamps (tracks how many needed the slow path).
+# Every load_usage call starts a new one, so after a call its counts and
+# detected format are for that call only.
+date_parser = DateParser()
 
 ###############################################################################
 class UseEntry:
@@ -107,49 +148,413 @@ def update_dictionary(dictionary, entry):
 
 
 ###############################################################################
-# Read entries in the DLV_Use_Log text file and close the file at the end
-with open(log_path, 'r') as file:
+def parse_line(line, parser = None):
+    '''
+    Create an entry from a line of the DLV Use Log.
+        Parameters:
+            line (str): a line of the log
+            parser: DateParser for the line's timestamp (None - date_parser)
+        Return:
+            None if the line is excluded or not production/closing, otherwise
+            a UseEntry with the report name, folder, user ID, and date
+    '''
+    # Fix line's formatting
+    line = line.rstrip('\r\n')
+    line = line.replace('"', '')
+    line = line.replace('\\', '/')
+    line = line.lstrip('/')
+    line = line.split(',')
 
-    # For each entry
-    for line in file:
-        # Fix line's formatting
-        line = line.replace('"', '')        
-        line = line.replace('\\', '/')
-        line = line.lstrip('/')
-        line = line.split(',')
+    # Get the entry's user ID and convert to uppercase
+    user = line[2].upper()
+    # Split the parts of the path into a list
+    path = line[0].split('/')
+
+    # Production/closing and not in the list of excluded users/folders
+    if (("Production" in line[0] or "Closing" in line[0]) and
+        user not in excluded_users and path[3] not in excluded_folders):
+
+        # Get the formatted report name using the folder and name
+        entry_name = format_report_name(path[3], line[1])
+        # Get whether it's production or closing
+        folder = path[2].split('-')[2].strip()
+        # Read the date string into a datetime object
+        date = (parser or date_parser).parse(line[5])
+
+        # Create an entry with the report name, folder, user ID, and date
+        return UseEntry(entry_name, folder, user, date)
+
+    return None
+
+
+###############################################################################
+def read_log(path, offset, cl_usage, prod_usage, usage_index = None,
+             parser = None, to_eof = False):
+    '''
+    Read the log from a byte offset and keep the latest entry for each report.
+    Only complete lines are read (unless to_eof), so a line that is still
+    being written is picked up by the next run.
+        Parameters:
+            path: path to the DLV Use Log
+            offset: byte offset to start reading from
+            cl_usage: closing usage dictionary to update
+            prod_usage: production usage dictionary to update
+            usage_index: UsageIndex to add every entry to (optional)
+            parser: DateParser for the timestamps (None - date_parser)
+            to_eof: True - also read a last line without a line break (when
+                    there's no checkpoint for a later run to pick it up)
+        Return:
+            offset (int): byte offset right after the last line read
+    '''
+    # Read the log as bytes so the offset can be tracked
+    with open(path, 'rb') as file:
+        file.seek(offset)
+
+        # For each entry
+        for raw_line in file:
+            # Stop at a partial last line
+            if not raw_line.endswith(b'\n') and not to_eof:
+                break
+            offset += len(raw_line)
+
+            entry = parse_line(raw_line.decode(log_encoding), parser)
+            if entry is not None:
+                add_entry(entry, cl_usage, prod_usage, usage_index)
+
+    return offset
+
+
+###############################################################################
+def add_entry(entry, cl_usage, prod_usage, usage_index = None):
+    '''
+    Add an entry from the log to the usage dictionaries and usage history.
+        Parameters:
+            entry: a UseEntry
+            cl_usage: closing usage dictionary to update
+            prod_usage: production usage dictionary to update
+            usage_index: UsageIndex to add the entry to (optional)
+    '''
+    # Add it to the usage history
+    if usage_index is not None:
+        usage_index.add(entry)
 
-        # Get the entry's user ID and convert to uppercase
-        user = line[2].upper()
-        # Split the parts of the path into a list
-        path = line[0].split('/')
-        
-        # Production/closing and not in the list of excluded users/folders
-        if (("Production" in line[0] or "Closing" in line[0]) and
-            user not in excluded_users and path[3] not in excluded_folders):
-
-            # Get the formatted report name using the folder and name
-            entry_name = format_report_name(path[3], line[1])
-            # Get whether it's production or closing
-            folder = path[2].split('-')[2].strip()
-            # Read the date string into a datetime object
-            date = parse(line[5])
-            
-            # Create an entry with the report name, folder, user ID, and date
-            entries.append(UseEntry(entry_name, folder, user, date))
-
-# Sort by folder, then report name, then date
-entries.sort(key = lambda x: (x.folder, x.name, x.date))
-
-# Loop through all the reports
-for entry in entries:
-    
     # If it's a closing entry
-    if entry.folder == "Closing":        
+    if entry.folder == "Closing":
         # Update the closing usage dictionary with the entry
-        cl_usage = update_dictionary(cl_usage, entry)
-        
+        update_dictionary(cl_usage, entry)
+
     else:
         # Update the production usage dictionary
-        prod_usage = update_dictionary(prod_usage, entry)
+        update_dictionary(prod_usage, entry)
+
+
+###############################################################################
+def merge_usage(dictionary, partial):
+    '''
+    Merge a usage dictionary from a later part of the log into a dictionary,
+    with the same rules as update_dictionary (only a more recent date
+    replaces what's stored, so on a tie the earlier line in the log wins).
+        Parameters:
+            dictionary: usage dictionary to update
+            partial: usage dictionary from a later part of the log
+        Return:
+            dictionary: the updated dictionary
+    '''
+    for name, value in partial.items():
+        if name not in dictionary or value[1] > dictionary[name][1]:
+            dictionary[name] = value
+
+    return dictionary
+
+
+###############################################################################
+def log_ranges(log, start, end, parts):
+    '''
+    Split part of the log into byte ranges that each end right after a line
+    break.
+        Parameters:
+            log: the log memory mapped (or the log's bytes)
+            start: byte offset of the start of a line
+            end: byte offset right after the last line break to read
+            parts: number of ranges to split it into (at most)
+        Return:
+            ranges (list): (start, end) of each range, in order
+    '''
+    ranges = []
+    for i in range(1, parts):
+        # Move the cut forward to the next line break
+        cut = log.find(b'\n', start + (end - start) * i // parts, end)
+        if cut == -1:
+            break
+        if cut + 1 > start:
+            ranges.append((start, cut + 1))
+            start = cut + 1
+
+    if start < end:
+        ranges.append((start, end))
+
+    return ranges
+
+
+###############################################################################
+def read_range(path, start, end, date_format):
+    '''
+    Read a range of the log in a separate process.
+        Parameters:
+            path: path to the DLV Use Log
+            start: byte offset of the start of a line
+            end: byte offset right after a line break
+            date_format: timestamp format detected for the log (None - detect
+                         it from the range)
+        Return:
+            A list of the range's partial results:
+                0 - cl_usage: closing usage dictionary
+                1 - prod_usage: production usage dictionary
+                2 - usage_index: UsageIndex of the range
+                3 - fast_path: timestamps parsed with the format
+                4 - slow_path: timestamps that fell back to dateutil
+    '''
+    cl_usage, prod_usage, usage_index = ({}, {}, UsageIndex())
+
+    # Each process gets its own parser, set to the format the serial read
+    # would have detected
+    parser = DateParser()
+    if date_format is not None:
+        parser.set_format(date_format)
+
+    with open(path, 'rb') as file, \
+         mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as log:
+        log.seek(start)
+        while log.tell() < end:
+            entry = parse_line(log.readline().decode(log_encoding), parser)
+            if entry is not None:
+                add_entry(entry, cl_usage, prod_usage, usage_index)
+
+    return (cl_usage, prod_usage, usage_index, parser.fast_path,
+            parser.slow_path)
+
+
+###############################################################################
+def read_log_parallel(path, offset, cl_usage, prod_usage, usage_index = None,
+                      workers = usage_workers, parser = None, to_eof = False):
+    '''
+    Read the log from a byte offset like read_log, with the lines split into
+    ranges that are parsed in a pool of processes. Logs too small to be worth
+    splitting are read with read_log.
+        Parameters:
+            path: path to the DLV Use Log
+            offset: byte offset to start reading from
+            cl_usage: closing usage dictionary to update
+            prod_usage: production usage dictionary to update
+            usage_index: UsageIndex to add every entry to (optional)
+            workers: number of processes (None - one for each core)
+            parser: DateParser for the timestamps, which the counts from
+                    every process are added to (None - date_parser)
+            to_eof: True - also read a last line without a line break
+        Return:
+            offset (int): byte offset right after the last line read
+    '''
+    parser = parser or date_parser
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    parts = min(workers * ranges_per_worker, (size - offset) // min_range_size)
+    if workers <= 1 or parts <= 1:
+        return read_log(path, offset, cl_usage, prod_usage, usage_index,
+                        parser, to_eof)
+
+    with open(path, 'rb') as file, \
+         mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as log:
+        # Stop at a partial last line, like read_log
+        end = size if to_eof else max(log.rfind(b'\n', offset) + 1, offset)
+
+        # Read up to the first timestamp here, so every range uses the format
+        # the serial read would detect from it
+        log.seek(offset)
+        while parser.format is None and log.tell() < end:
+            entry = parse_line(log.readline().decode(log_encoding), parser)
+            if entry is not None:
+                add_entry(entry, cl_usage, prod_usage, usage_index)
+
+        ranges = log_ranges(log, log.tell(), end, parts)
+
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        results = [pool.submit(read_range, path, start, stop, parser.format)
+                   for (start, stop) in ranges]
+
+        # Merge the partial results in the order of the ranges
+        for result in results:
+            cl_part, prod_part, index_part, fast, slow = result.result()
+            merge_usage(cl_usage, cl_part)
+            merge_usage(prod_usage, prod_part)
+            if usage_index is not None:
+                usage_index.merge(index_part)
+            parser.fast_path += fast
+            parser.slow_path += slow
+
+    return end
+
+
+###############################################################################
+def log_fingerprint(path, offset):
+    '''
+    Fingerprint the part of the log that was read, so a log that was rotated
+    or replaced (even by one that has grown past the offset) can be told apart
+    from the same log with lines added.
+        Parameters:
+            path: path to the DLV Use Log
+            offset: byte offset the log was read up to
+        Return:
+            The hex digest of the start of the log and the bytes right before
+            the offset
+    '''
+    digest = hashlib.blake2b(digest_size = 16)
+
+    with open(path, 'rb') as file:
+        digest.update(file.read(min(fingerprint_size, offset)))
+        start = max(offset - fingerprint_size, 0)
+        file.seek(start)
+        digest.update(file.read(offset - start))
+
+    return digest.hexdigest()
+
+
+###############################################################################
+def exclusions():
+    '''
+    Get the excluded users and folders the way they're saved in the
+    checkpoint.
+        Return:
+            A dictionary with the sorted lists of excluded users and folders
+    '''
+    return {'users': sorted(excluded_users),
+            'folders': sorted(excluded_folders)}
+
+
+###############################################################################
+def load_checkpoint(path, log):
+    '''
+    Load the usage dictionaries saved by the last run.
+        Parameters:
+            path: path to the checkpoint file
+            log: path to the DLV Use Log the checkpoint should be for
+        Return:
+            A list with the checkpoint information (empty if there is no
+            usable checkpoint):
+                0 - offset: byte offset the log was read up to
+                1 - cl_usage: closing usage dictionary
+                2 - prod_usage: production usage dictionary
+                3 - usage_index: UsageIndex of the usage history
+    '''
+    empty = (0, {}, {}, UsageIndex())
+
+    # No checkpoint yet or it's unreadable
+    try:
+        with open(path, 'r') as file:
+            saved = json.load(file)
+    except (OSError, ValueError):
+        return empty
+
+    # Start over if it was for another log or the log was replaced/truncated
+    if saved['log_path'] != log or os.path.getsize(log) < saved['offset']:
+        return empty
+
+    # Checkpoints from before the usage index and the fingerprint need the
+    # whole log read again
+    if 'usage_index' not in saved or 'fingerprint' not in saved:
+        return empty
+
+    # A log that was replaced doesn't match the fingerprint (even if it's
+    # already longer than the offset)
+    if saved['fingerprint'] != log_fingerprint(log, saved['offset']):
+        return empty
+
+    # The saved entries were filtered with the exclusions at the time
+    if saved.get('excluded') != exclusions():
+        return empty
+
+    # Convert the stored values back to (date - user ID, datetime)
+    usage = []
+    for key in ('cl_usage', 'prod_usage'):
+        usage.append({name: (value[0], dt.fromisoformat(value[1]))
+                      for name, value in saved[key].items()})
+
+    return (saved['offset'], usage[0], usage[1],
+            UsageIndex.from_json(saved['usage_index']))
+
+
+###############################################################################
+def save_checkpoint(path, log, offset, cl_usage, prod_usage, usage_index):
+    '''
+    Save the usage dictionaries, the usage index, the byte offset the log
+    was read up to, the log's fingerprint and the exclusions the entries were
+    filtered with.
+        Parameters:
+            path: path to the checkpoint file
+            log: path to the DLV Use Log
+            offset: byte offset the log was read up to
+            cl_usage: closing usage dictionary
+            prod_usage: production usage dictionary
+            usage_index: UsageIndex of the usage history
+    '''
+    saved = {'log_path': log, 'offset': offset,
+             'fingerprint': log_fingerprint(log, offset),
+             'excluded': exclusions(),
+             'usage_index': usage_index.to_json()}
+
+    # Store the datetimes as ISO strings
+    for key, usage in (('cl_usage', cl_usage), ('prod_usage', prod_usage)):
+        saved[key] = {name: (value[0], value[1].isoformat())
+                      for name, value in usage.items()}
+
+    write_json(path, saved)
+
+
+###############################################################################
+def load_usage(log_path = log_path, checkpoint_path = checkpoint_path,
+               rebuild = False, workers = usage_workers):
+    '''
+    Get the last used dictionaries for production and closing, picking up
+    where the last run left off and reading only the new lines in the log.
+    When the whole log has to be read, it's read in parallel. The timestamps
+    are parsed with a new DateParser (left in date_parser for its counts), so
+    nothing carries over from an earlier call in the same process.
+        Parameters:
+            log_path: path to the DLV Use Log
+            checkpoint_path: path to the checkpoint file (None - read the
+                             whole log and don't save a checkpoint)
+            rebuild: True - ignore the checkpoint and read the whole log
+            workers: processes for reading the whole log (None - one for each
+                     core, 1 - read it in this process)
+        Return:
+            A list of the usage dictionaries where keys:report names,
+            values:date - user ID, datetime, and the usage history
+                0 - cl_usage: closing usage dictionary
+                1 - prod_usage: production usage dictionary
+                2 - usage_index: UsageIndex of every report's usage
+    '''
+    global date_parser
+    date_parser = DateParser()
+
+    # Start from the checkpoint if there is one
+    if checkpoint_path is None or rebuild:
+        offset, cl_usage, prod_usage, usage_index = (0, {}, {}, UsageIndex())
+    else:
+        offset, cl_usage, prod_usage, usage_index = load_checkpoint(
+            checkpoint_path, log_path)
+
+    # A full rebuild is split up between processes, new lines are read here.
+    # Without a checkpoint no later run picks up a partial last line, so the
+    # log is read to the end
+    to_eof = checkpoint_path is None
+    if offset == 0:
+        offset = read_log_parallel(log_path, offset, cl_usage, prod_usage,
+                                   usage_index, workers, date_parser, to_eof)
+    else:
+        offset = read_log(log_path, offset, cl_usage, prod_usage, usage_index,
+                          date_parser, to_eof)
 
+    if checkpoint_path is not None:
+        save_checkpoint(checkpoint_path, log_path, offset, cl_usage,
+                        prod_usage, usage_index)
 
+    return (cl_usage, prod_usage, usage_index)
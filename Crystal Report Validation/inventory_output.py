@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# Import libraries
+import csv
+import os
+from itertools import zip_longest
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+'''
+Output stage for the inventory. Each sheet is a dictionary of column titles
+with lists of rows (the columns can have different lengths). Rows are streamed
+straight into a write-only workbook, or into CSV files, one row at a time
+without building dataframes.
+
+Parquet output needs the optional pyarrow module.
+'''
+
+# Header style (same look as the pandas Excel writer)
+header_font = Font(bold = True)
+header_side = Side(style = 'thin')
+header_border = Border(left = header_side, right = header_side,
+                       top = header_side, bottom = header_side)
+header_alignment = Alignment(horizontal = 'center', vertical = 'top')
+
+
+###############################################################################
+def sheet_rows(columns):
+    '''
+    Get the rows of a sheet from its columns.
+        Parameters:
+            columns: dictionary of column titles with lists of rows
+        Return:
+            Generator of the header row and then each row, where shorter
+            columns are filled in with blanks
+    '''
+    yield list(columns)
+
+    for row in zip_longest(*columns.values()):
+        yield list(row)
+
+
+###############################################################################
+def header_cells(sheet, titles):
+    '''
+    Create the styled header cells for a write-only sheet.
+        Parameters:
+            sheet: the write-only worksheet
+            titles: the column titles
+        Return:
+            cells (list): a WriteOnlyCell for each title
+    '''
+    cells = []
+
+    for title in titles:
+        cell = WriteOnlyCell(sheet, value = title)
+        cell.font = header_font
+        cell.border = header_border
+        cell.alignment = header_alignment
+        cells.append(cell)
+
+    return cells
+
+
+###############################################################################
+def write_excel(path, sheets):
+    '''
+    Stream the sheets into a write-only Excel workbook.
+        Parameters:
+            path: path of the Excel file to create
+            sheets: dictionary of sheet names with their columns
+    '''
+    workbook = Workbook(write_only = True)
+
+    for name, columns in sheets.items():
+        sheet = workbook.create_sheet(name)
+        rows = sheet_rows(columns)
+
+        sheet.append(header_cells(sheet, next(rows)))
+        for row in rows:
+            sheet.append(row)
+
+    workbook.save(path)
+
+
+###############################################################################
+def sheet_path(path, name, extension):
+    '''
+    Get the file name for one sheet when each sheet gets its own file.
+        Parameters:
+            path: path of the workbook (ex. "Crystal Reports Inventory.xlsx")
+            name: name of the sheet
+            extension: extension of the new file (ex. ".csv")
+        Return:
+            The path (ex. "Crystal Reports Inventory - Extras.csv")
+    '''
+    return os.path.splitext(path)[0] + ' - ' + name + extension
+
+
+###############################################################################
+def write_csv(path, sheets):
+    '''
+    Stream each sheet into its own CSV file.
+        Parameters:
+            path: path of the workbook the CSV names are based on
+            sheets: dictionary of sheet names with their columns
+        Return:
+            paths (list): paths of the CSV files created
+    '''
+    paths = []
+
+    for name, columns in sheets.items():
+        paths.append(sheet_path(path, name, '.csv'))
+
+        with open(paths[-1], 'w', newline = '', encoding = 'utf-8') as file:
+            csv.writer(file).writerows(sheet_rows(columns))
+
+    return paths
+
+
+###############################################################################
+def write_parquet(path, sheets):
+    '''
+    Write each sheet into its own Parquet file (needs pyarrow).
+        Parameters:
+            path: path of the workbook the Parquet names are based on
+            sheets: dictionary of sheet names with their columns
+        Return:
+            paths (list): paths of the Parquet files created
+    '''
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet output needs pyarrow (pip install pyarrow)")
+
+    paths = []
+
+    for name, columns in sheets.items():
+        paths.append(sheet_path(path, name, '.parquet'))
+
+        # Fill in shorter columns with blanks so they're all the same length
+        length = max((len(col) for col in columns.values()), default = 0)
+        table = pa.table({title: list(col) + [None] * (length - len(col))
+                          for title, col in columns.items()})
+        pq.write_table(table, paths[-1])
+
+    return paths
+
+
+# Writer for each output format
+writers = {'xlsx': write_excel, 'csv': write_csv, 'parquet': write_parquet}
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# Import libraries
+from datetime import datetime as dt
+from dateutil.parser import parse
+
+'''
+Fast parsing for the timestamps in the DLV_Use_Log. The format of the log's
+timestamps is detected from the first one and every timestamp after that is
+parsed with a hand-written fixed-format parser (or a precompiled strptime
+format). Anything that doesn't match goes through dateutil's general parser
+and is counted as a slow-path parse.
+'''
+
+
+###############################################################################
+def parse_us_12h(text):
+    '''
+    Parse a timestamp like "8/11/2022 11:41:13 AM" (no zero padding needed).
+        Parameters:
+            text (str): the timestamp
+        Return:
+            The timestamp as a datetime object
+    '''
+    date, time, half = text.split(' ')
+    month, day, year = date.split('/')
+    hour, minute, second = time.split(':')
+
+    # Convert the hour to a 24 hour clock
+    hour = int(hour)
+    half = half.upper()
+    if not 1 <= hour <= 12 or half not in ('AM', 'PM'):
+        raise ValueError("not a 12 hour timestamp: " + text)
+    hour = hour % 12 + (12 if half == 'PM' else 0)
+
+    return dt(int(year), int(month), int(day), hour, int(minute), int(second))
+
+
+###############################################################################
+def parse_us_24h(text):
+    '''
+    Parse a timestamp like "8/11/2022 13:41:13" (no zero padding needed).
+        Parameters:
+            text (str): the timestamp
+        Return:
+            The timestamp as a datetime object
+    '''
+    date, time = text.split(' ')
+    month, day, year = date.split('/')
+    hour, minute, second = time.split(':')
+
+    return dt(int(year), int(month), int(day), int(hour), int(minute),
+              int(second))
+
+
+###############################################################################
+def parse_iso(text):
+    '''
+    Parse a fixed width timestamp like "2022-08-11 13:41:13".
+        Parameters:
+            text (str): the timestamp
+        Return:
+            The timestamp as a datetime object
+    '''
+    if (len(text) != 19 or text[4] != '-' or text[7] != '-' or
+        text[13] != ':' or text[16] != ':'):
+        raise ValueError("not an ISO timestamp: " + text)
+
+    return dt(int(text[0:4]), int(text[5:7]), int(text[8:10]),
+              int(text[11:13]), int(text[14:16]), int(text[17:19]))
+
+
+# Formats the log might use, in the order they are tried, with the
+# hand-written parser for each (None - use strptime with the format)
+log_formats = [('%m/%d/%Y %I:%M:%S %p', parse_us_12h),
+               ('%m/%d/%Y %H:%M:%S', parse_us_24h),
+               ('%Y-%m-%d %H:%M:%S', parse_iso),
+               ('%Y-%m-%dT%H:%M:%S', None),
+               ('%Y-%m-%d %H:%M:%S.%f', None),
+               ('%m/%d/%Y %I:%M %p', None),
+               ('%m/%d/%Y %H:%M', None),
+               ('%m/%d/%Y', None)]
+
+
+###############################################################################
+class DateParser:
+    '''
+    This class parses the log's timestamps with the format detected from the
+    first timestamp it is given.
+
+    Attributes:
+        format (str): the detected strptime format (None until detected)
+        fast_path (int): number of timestamps parsed with the format
+        slow_path (int): number of timestamps that fell back to dateutil
+    '''
+    def __init__(self, formats = log_formats):
+        '''
+        Constructor for a DateParser.
+        '''
+        self.formats = formats
+        self.format = None
+        self.fast_path = 0
+        self.slow_path = 0
+        self._parser = None
+
+    def detect(self, text):
+        '''
+        Find the first format that the timestamp matches.
+            Parameters:
+                text (str): a timestamp from the log
+            Return:
+                True if a format was found, False otherwise
+        '''
+        for fmt, parser in self.formats:
+            try:
+                dt.strptime(text, fmt)
+            except ValueError:
+                continue
+
+            self.set_format(fmt)
+            return True
+
+        return False
+
+    def set_format(self, fmt):
+        '''
+        Use a format that was already detected (ex. by the process that
+        split up the log).
+            Parameters:
+                fmt (str): one of the strptime formats in formats
+        '''
+        for known, parser in self.formats:
+            if known == fmt:
+                self.format = fmt
+                # Use strptime with the format if there's no hand-written
+                # parser
+                self._parser = parser or (lambda text: dt.strptime(text, fmt))
+                return
+
+    def parse(self, text):
+        '''
+        Parse a timestamp from the log.
+            Parameters:
+                text (str): the timestamp
+            Return:
+                The timestamp as a datetime object
+        '''
+        text = text.strip()
+
+        # Detect the format (keep trying until a timestamp matches one)
+        if self._parser is not None or self.detect(text):
+            try:
+                date = self._parser(text)
+                self.fast_path += 1
+                return date
+            except ValueError:
+                pass
+
+        # Doesn't match the format - use the general parser
+        self.slow_path += 1
+        return parse(text)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# Import libraries
+import sqlite3
+import threading
+
+'''
+On-disk cache of the last scan of every report folder, stored in a local SQLite
+file. Each folder is keyed by its environment path and folder name and keeps
+the folder's date modified along with the formatted report names, dates and
+extra files/folders found inside of it, and the size and date modified of
+every report file. Overwriting a report in place doesn't change its folder's
+date modified, so a folder is only used from the cache when its date modified
+hasn't changed and a listing of it shows the same size and date modified for
+every report. That means every folder is still listed on every run: the folder
+cache saves the CPU work of processing a folder again (formatting the report
+names and sorting out the extras), not network round trips.
+
+The cache also keeps the content fingerprint of every report that was hashed
+for drift detection, keyed by its path, size and date modified.
+'''
+
+# Version of the folder tables (older caches are dropped and rebuilt)
+schema_version = 2
+
+# Tables for folders, the reports inside of them, their files and extras
+schema = '''
+CREATE TABLE IF NOT EXISTS folders (
+    env TEXT, folder TEXT, mtime REAL, PRIMARY KEY (env, folder));
+CREATE TABLE IF NOT EXISTS reports (
+    env TEXT, folder TEXT, position INTEGER, name TEXT, date TEXT);
+CREATE TABLE IF NOT EXISTS report_files (
+    env TEXT, folder TEXT, name TEXT, size INTEGER, mtime REAL);
+CREATE TABLE IF NOT EXISTS extras (
+    env TEXT, folder TEXT, position INTEGER, kind TEXT, path TEXT);
+CREATE INDEX IF NOT EXISTS reports_folder ON reports (env, folder);
+CREATE INDEX IF NOT EXISTS report_files_folder ON report_files (env, folder);
+CREATE INDEX IF NOT EXISTS extras_folder ON extras (env, folder);
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY, size INTEGER, mtime REAL, digest TEXT);
+'''
+
+
+###############################################################################
+class ScanCache:
+    '''
+    This class is the persisted scan state for the report folders.
+
+    Attributes:
+        path (str): path to the SQLite file
+    '''
+    def __init__(self, path):
+        '''
+        Constructor for a ScanCache, creating the file if it doesn't exist.
+        '''
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread = False)
+
+        # Caches from before the report files were kept can't be checked
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version < schema_version:
+            self._db.executescript('DROP TABLE IF EXISTS folders; '
+                                   'DROP TABLE IF EXISTS reports; '
+                                   'DROP TABLE IF EXISTS extras;')
+            self._db.execute('PRAGMA user_version = %d' % schema_version)
+        self._db.executescript(schema)
+
+    def get(self, env, folder, mtime):
+        '''
+        Get the cached scan of a folder if it hasn't changed.
+            Parameters:
+                env: path of the environment
+                folder: name of the report folder
+                mtime: the folder's current date modified
+            Return:
+                None if the folder isn't cached or has changed, otherwise:
+                    0 - reports (dict): keys:report names, values:dates
+                    1 - files (list): paths to extra files
+                    2 - folders (list): paths to extra folders
+                    3 - report_files (dict): keys:report file names,
+                        values:(size, date modified) when it was cached
+        '''
+        with self._lock:
+            row = self._db.execute(
+                'SELECT mtime FROM folders WHERE env = ? AND folder = ?',
+                (env, folder)).fetchone()
+
+            # Not cached yet or the folder changed since it was cached
+            if row is None or row[0] != mtime:
+                return None
+
+            reports = dict(self._db.execute(
+                'SELECT name, date FROM reports WHERE env = ? AND folder = ? '
+                'ORDER BY position', (env, folder)))
+            extras = self._db.execute(
+                'SELECT kind, path FROM extras WHERE env = ? AND folder = ? '
+                'ORDER BY position', (env, folder)).fetchall()
+            report_files = {name: (size, file_mtime) for name, size, file_mtime
+                            in self._db.execute(
+                                'SELECT name, size, mtime FROM report_files '
+                                'WHERE env = ? AND folder = ?', (env, folder))}
+
+        files = [path for kind, path in extras if kind == 'file']
+        folders = [path for kind, path in extras if kind == 'folder']
+
+        return (reports, files, folders, report_files)
+
+    def put(self, env, folder, mtime, reports, files, folders, report_files):
+        '''
+        Store the scan of a folder, replacing what was cached for it.
+            Parameters:
+                env: path of the environment
+                folder: name of the report folder
+                mtime: the folder's date modified when it was scanned
+                reports: dictionary of report names and dates in the folder
+                files: paths to extra files in the folder
+                folders: paths to extra folders in the folder
+                report_files: dictionary of report file names and their
+                              (size, date modified)
+        '''
+        extras = [('file', path) for path in files]
+        extras += [('folder', path) for path in folders]
+
+        with self._lock, self._db:
+            self._delete(env, folder)
+            self._db.execute('INSERT INTO folders VALUES (?, ?, ?)',
+                             (env, folder, mtime))
+            self._db.executemany(
+                'INSERT INTO reports VALUES (?, ?, ?, ?, ?)',
+                [(env, folder, i, name, date)
+                 for i, (name, date) in enumerate(reports.items())])
+            self._db.executemany(
+                'INSERT INTO extras VALUES (?, ?, ?, ?, ?)',
+                [(env, folder, i, kind, path)
+                 for i, (kind, path) in enumerate(extras)])
+            self._db.executemany(
+                'INSERT INTO report_files VALUES (?, ?, ?, ?, ?)',
+                [(env, folder, name, size, file_mtime)
+                 for name, (size, file_mtime) in report_files.items()])
+
+    def prune(self, env, folders):
+        '''
+        Remove cached folders of an environment that no longer exist.
+            Parameters:
+                env: path of the environment
+                folders: names of the folders that are still there
+        '''
+        with self._lock, self._db:
+            cached = self._db.execute(
+                'SELECT folder FROM folders WHERE env = ?', (env,)).fetchall()
+
+            for (folder,) in cached:
+                if folder not in folders:
+                    self._delete(env, folder)
+
+    def get_hash(self, path, size, mtime):
+        '''
+        Get the cached fingerprint of a report if it hasn't changed.
+            Parameters:
+                path: path to the report
+                size: the report's current size in bytes
+                mtime: the report's current date modified
+            Return:
+                The hex digest, or None if it isn't cached or has changed
+        '''
+        with self._lock:
+            row = self._db.execute(
+                'SELECT size, mtime, digest FROM hashes WHERE path = ?',
+                (path,)).fetchone()
+
+        if row is None or row[0] != size or row[1] != mtime:
+            return None
+
+        return row[2]
+
+    def put_hashes(self, hashes):
+        '''
+        Store the fingerprints of reports, replacing what was cached for them.
+            Parameters:
+                hashes: list of (path, size, mtime, digest)
+        '''
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)', hashes)
+
+    def clear(self):
+        '''
+        Remove everything from the cache to force a full rebuild.
+        '''
+        with self._lock, self._db:
+            for table in ('folders', 'reports', 'report_files', 'extras',
+                          'hashes'):
+                self._db.execute('DELETE FROM ' + table)
+
+    def close(self):
+        '''
+        Close the SQLite file.
+        '''
+        self._db.close()
+
+    def _delete(self, env, folder):
+        # Remove a folder and everything stored for it
+        for table in ('folders', 'reports', 'report_files', 'extras'):
+            self._db.execute('DELETE FROM ' + table +
+                             ' WHERE env = ? AND folder = ?', (env, folder))
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# Import libraries
+from bisect import bisect_left, bisect_right
+from datetime import datetime as dt
+
+'''
+Pre-aggregated usage index for the DLV_Use_Log. Each report keeps columns of
+the days it was used (as date ordinals) with the number of hits on each day,
+plus the distinct users and the first and last time it was used. Questions
+like "unused for 12 months" or "uses per quarter" can be answered from the
+index without parsing the log again.
+'''
+
+
+###############################################################################
+class ReportUsage:
+    '''
+    This class is the usage history of one report.
+
+    Attributes:
+        days (list): sorted date ordinals of the days the report was used
+        hits (list): number of uses on each day in days
+        users (set): IDs of the users who used the report
+        first (datetime): first time the report was used
+        last (datetime): last time the report was used
+    '''
+    __slots__ = ('days', 'hits', 'users', 'first', 'last')
+
+    def __init__(self):
+        '''
+        Constructor for a report with no usage.
+        '''
+        self.days = []
+        self.hits = []
+        self.users = set()
+        self.first = None
+        self.last = None
+
+    def add(self, date, user, hits = 1):
+        '''
+        Add uses of the report.
+            Parameters:
+                date: datetime of the use
+                user: ID of the user
+                hits: number of uses to add for that day
+        '''
+        day = date.toordinal()
+
+        # The log is in order, so the day is almost always the last one
+        if self.days and self.days[-1] == day:
+            self.hits[-1] += hits
+        elif not self.days or self.days[-1] < day:
+            self.days.append(day)
+            self.hits.append(hits)
+        else:
+            i = bisect_left(self.days, day)
+            if self.days[i] == day:
+                self.hits[i] += hits
+            else:
+                self.days.insert(i, day)
+                self.hits.insert(i, hits)
+
+        self.users.add(user)
+        if self.first is None or date < self.first:
+            self.first = date
+        if self.last is None or date > self.last:
+            self.last = date
+
+    def hits_between(self, start, end):
+        '''
+        Get the number of uses between two dates (inclusive).
+            Parameters:
+                start: first date (date or datetime)
+                end: last date (date or datetime)
+            Return:
+                The total hits on the days between the dates
+        '''
+        lo = bisect_left(self.days, start.toordinal())
+        hi = bisect_right(self.days, end.toordinal())
+
+        return sum(self.hits[lo:hi])
+
+    def merge(self, other):
+        '''
+        Add all the usage from another ReportUsage.
+        '''
+        counts = dict(zip(self.days, self.hits))
+        for day, hits in zip(other.days, other.hits):
+            counts[day] = counts.get(day, 0) + hits
+
+        self.days = sorted(counts)
+        self.hits = [counts[day] for day in self.days]
+        self.users |= other.users
+
+        if other.first is not None:
+            if self.first is None or other.first < self.first:
+                self.first = other.first
+            if self.last is None or other.last > self.last:
+                self.last = other.last
+
+    def to_json(self):
+        '''
+        Convert to a dictionary that can be saved as JSON.
+        '''
+        return {'days': self.days, 'hits': self.hits,
+                'users': sorted(self.users), 'first': self.first.isoformat(),
+                'last': self.last.isoformat()}
+
+    @classmethod
+    def from_json(cls, saved):
+        '''
+        Create a ReportUsage from a dictionary made by to_json.
+        '''
+        usage = cls()
+        usage.days = saved['days']
+        usage.hits = saved['hits']
+        usage.users = set(saved['users'])
+        usage.first = dt.fromisoformat(saved['first'])
+        usage.last = dt.fromisoformat(saved['last'])
+
+        return usage
+
+
+###############################################################################
+class UsageIndex:
+    '''
+    This class is the usage history of every report in the log.
+
+    Attributes:
+        reports (dict): keys:(folder, report name) where folder is
+                        "Production" or "Closing", values:ReportUsage
+    '''
+    def __init__(self):
+        '''
+        Constructor for an empty UsageIndex.
+        '''
+        self.reports = {}
+
+    def add(self, entry):
+        '''
+        Add a UseEntry from the log.
+        '''
+        key = (entry.folder, entry.name)
+        usage = self.reports.get(key)
+
+        if usage is None:
+            usage = self.reports[key] = ReportUsage()
+
+        usage.add(entry.date, entry.user)
+
+    def get(self, folder, name):
+        '''
+        Get the usage history of a report.
+            Parameters:
+                folder: "Production" or "Closing"
+                name: formatted report name
+            Return:
+                The report's ReportUsage, or None if it was never used
+        '''
+        return self.reports.get((folder, name))
+
+    def merge(self, other):
+        '''
+        Add all the usage from another UsageIndex.
+        '''
+        for key, usage in other.reports.items():
+            if key in self.reports:
+                self.reports[key].merge(usage)
+            else:
+                self.reports[key] = usage
+
+    def to_json(self):
+        '''
+        Convert to a dictionary that can be saved as JSON.
+        '''
+        saved = {}
+        for (folder, name), usage in self.reports.items():
+            saved.setdefault(folder, {})[name] = usage.to_json()
+
+        return saved
+
+    @classmethod
+    def from_json(cls, saved):
+        '''
+        Create a UsageIndex from a dictionary made by to_json.
+        '''
+        index = cls()
+        for folder, reports in saved.items():
+            for name, usage in reports.items():
+                index.reports[(folder, name)] = ReportUsage.from_json(usage)
+
+        return index
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Import libraries
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+'''
+Per-source scheduling on a shared thread pool, used by the Crystal scan (one
+queue per batch server) and the oneWeigh archive (one queue per machine). A
+SlotQueue holds its jobs back until it has a free slot and only then submits
+them to the pool, so a pool thread never sits blocked waiting on a busy server
+or machine while jobs for the others wait behind it.
+'''
+
+
+###############################################################################
+class SlotQueue:
+    '''
+    This class is a thread-safe queue of jobs for one server or machine that
+    keeps at most a set number of them in a shared pool at a time.
+
+    Attributes:
+        pool (Executor): thread pool the jobs are run on
+        slots (int): number of the queue's jobs allowed in the pool at once
+    '''
+    def __init__(self, pool, slots):
+        '''
+        Constructor for an empty SlotQueue.
+            Parameters:
+                pool: thread pool the jobs are run on
+                slots: number of jobs allowed in the pool at once
+        '''
+        self.pool = pool
+        self.slots = slots
+        self._waiting = deque()
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args):
+        '''
+        Queue a job to run on the pool once the queue has a free slot.
+            Parameters:
+                func: function to run
+                args: arguments for func
+            Return:
+                A Future for what func returns
+        '''
+        future = Future()
+
+        with self._lock:
+            self._waiting.append((future, func, args))
+        self._start()
+
+        return future
+
+    def _start(self):
+        # Submit waiting jobs to the pool while there are free slots
+        while True:
+            with self._lock:
+                if self._running >= self.slots or not self._waiting:
+                    return
+                future, func, args = self._waiting.popleft()
+
+                # Skip jobs that were cancelled while they were waiting
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._running += 1
+
+            self.pool.submit(self._run, future, func, args)
+
+    def _run(self, future, func, args):
+        # Run a job on a pool thread, then free its slot for the next one
+        try:
+            result = func(*args)
+        except Exception as error:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._start()
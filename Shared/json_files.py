@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# Import libraries
+import json
+import os
+
+'''
+JSON state files shared by the Crystal inventory and the oneWeigh archive (the
+usage checkpoint, the machines cache, the watch marks and the run summaries).
+'''
+
+
+###############################################################################
+def write_json(path, data, indent = None):
+    '''
+    Write data to a JSON file. It's written to a temp file first and then
+    renamed over the old file, so a crash never leaves half a file behind.
+        Parameters:
+            path: path to the JSON file
+            data: value that can be saved as JSON
+            indent: indent for json.dump (None - all on one line)
+    '''
+    with open(path + '.tmp', 'w') as file:
+        json.dump(data, file, indent = indent)
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# Import libraries
+import cProfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime as dt
+
+# Import mods
+from json_files import write_json
+
+'''
+Instrumentation shared by the Crystal inventory and the oneWeigh archive. A
+RunStats keeps the wall time of each stage of a run and counters (files,
+bytes, stat calls, skips, ...) for each environment or machine, and writes
+them as a JSON run summary. profiled() is an opt-in cProfile hook for the
+command line.
+
+Both tools import this folder with:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 '..', 'Shared'))
+'''
+
+
+###############################################################################
+class RunStats:
+    '''
+    This class is the thread-safe timing and counters of one run.
+
+    Attributes:
+        tool (str): name of the script that was run
+        started (datetime): when the run started
+        stages (dict): keys:stage names, values:[seconds, calls] for the
+                       whole run
+        scopes (dict): keys:environment names or machine serials,
+                       values:dictionary of 'seconds' (Counter of the stage
+                       times in the scope) and 'counts' (Counter)
+    '''
+    def __init__(self, tool):
+        '''
+        Constructor for a RunStats starting now.
+        '''
+        self.tool = tool
+        self.started = dt.now()
+        self.stages = {}
+        self.scopes = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, scope = None):
+        '''
+        Time the with block as a stage of the run, or of one environment or
+        machine. Stages timed for a scope from several threads add up, so they
+        can be longer than the run itself.
+            Parameters:
+                name: name of the stage (ex. "scan", "copy")
+                scope: environment name or machine serial (None - the run)
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                if scope is None:
+                    totals = self.stages.setdefault(name, [0.0, 0])
+                    totals[0] += elapsed
+                    totals[1] += 1
+                else:
+                    self._scope(scope)['seconds'][name] += elapsed
+
+    def count(self, scope, **counts):
+        '''
+        Add to the counters of an environment or machine.
+            Parameters:
+                scope: environment name or machine serial
+                counts: names and amounts to add (ex. files = 3, bytes = 10)
+        '''
+        with self._lock:
+            self._scope(scope)['counts'].update(counts)
+
+    def summary(self):
+        '''
+        Get the run summary.
+            Return:
+                A dictionary that can be saved as JSON, with the totals of
+                every counter across the scopes
+        '''
+        with self._lock:
+            totals = Counter()
+            for scope in self.scopes.values():
+                totals.update(scope['counts'])
+
+            return {'tool': self.tool,
+                    'started': self.started.isoformat(timespec = 'seconds'),
+                    'seconds': time.perf_counter() - self._start,
+                    'stages': {name: {'seconds': seconds, 'calls': calls}
+                               for name, (seconds, calls)
+                               in self.stages.items()},
+                    'totals': dict(totals),
+                    'scopes': {name: {'seconds': dict(scope['seconds']),
+                                      'counts': dict(scope['counts'])}
+                               for name, scope in self.scopes.items()}}
+
+    def write(self, path):
+        '''
+        Write the run summary to a JSON file.
+            Parameters:
+                path: path to the JSON file
+        '''
+        write_json(path, self.summary(), indent = 2)
+
+    def _scope(self, scope):
+        # Counters of a scope, created the first time it's used
+        if scope not in self.scopes:
+            self.scopes[scope] = {'seconds': Counter(), 'counts': Counter()}
+
+        return self.scopes[scope]
+
+
+###############################################################################
+@contextmanager
+def profiled(path):
+    '''
+    Profile the with block with cProfile and save the stats (only the thread
+    that runs the block is profiled - view with python -m pstats <path>).
+        Parameters:
+            path: path to save the stats to (None - don't profile)
+    '''
+    if path is None:
+        yield
+        return
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
@@ -3,15 +3,32 @@
 '''
 Check local machines and archive/remove tickets basesd on set variables.
 
-Required modules: pandas, openpyxl 
+Required modules: openpyxl, python-dateutil
 '''
 import ow_variables as var
+from ow_bundle import PackStats, pack_archive
+from ow_copy import CopyStats, sync_copy
+from ow_index import ArchiveIndex, archive_key
+from ow_registry import load_registry
+from ow_retention import PurgeStats, purge_archive, remove_local
+from ow_ticket import parse_ticket
+from ow_watch import Backoff, WatchMarks
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from dateutil.parser import parse
 import logging
 import os
-import shutil
-import pandas as pd
+import subprocess
+import sys
+import threading
+import time
+
+#Instrumentation and scheduling shared with the Crystal inventory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                             'Shared'))
+from job_slots import SlotQueue
+from run_stats import RunStats, profiled
 
 #Make the ages timedelta objects in days
 local_max = timedelta(var.local_max * 365) # Max age of local machine files
@@ -19,24 +36,99 @@ archive_max = timedelta(var.archive_max * 365) # Max age of archive files
 
 #Import other variables
 archive_path = var.archive_path # Path to the archived files
+forms_path = var.forms_path # Path to the forms folder on each machine
 machines_excel = var.machines_excel #Path to excel of the machines info
+registry_cache_path = var.registry_cache_path #Local cache of the machines
+location_column = var.location_column #Column of the locations in the excel
+serial_column = var.serial_column #Column of the serials in the excel
 log_path = var.log_path #Path to log file to write to
+run_stats_path = var.run_stats_path #Path to the JSON summary of the run
+watch_interval = var.watch_interval # Seconds between polls of a busy machine
+watch_max_interval = var.watch_max_interval # Longest wait for an idle machine
+watch_marks_path = var.watch_marks_path # Saved high-water mark of each machine
+index_path = var.index_path #Path to the local index of archived forms
+skip_unchanged = var.skip_unchanged # True - skip forms already at the destination
+verify_hash = var.verify_hash # True - also compare content hashes before skipping
+mtime_slack = var.mtime_slack # Seconds the dates modified can differ by
+purge = var.purge_archive # True - prune archive folders older than archive_max
+remove_local_forms = var.remove_local # True - remove local forms once archived
+remove_verify_hash = var.remove_verify_hash # True - hash check before removing
+pack_bundles = var.pack_bundles # True - pack closed archive days into bundles
 log_details = var.log_details # True - show all details, False - show totals
+ping_timeout = var.ping_timeout # Milliseconds to wait for each ping reply
+ping_count = var.ping_count # Number of echo requests sent to each machine
+ping_workers = var.ping_workers # Machines pinged at the same time
+list_workers = var.list_workers # Machines listed at the same time
+copy_workers = var.copy_workers # Forms copied at the same time
+machine_copy_workers = var.machine_copy_workers # Copies from one machine at once
+share_copy_workers = var.share_copy_workers # Copies into the archive share at once
 
 machine_paths = [] # Paths to all the local machines
-archive = [] # List of files in the archive
+archive = None # ArchiveIndex of the forms in the archive (opened by main)
 num_archived = 0 # Track files copied to the archive
 num_local_removed = 0 # Track old files removed from local machines
+copy_stats = CopyStats() # Track bytes copied and saved by skipping
+machine_stats = {} # CopyStats of each machine (added into copy_stats at the end)
+run_stats = RunStats("oneweigh") # Stage times and counters of each machine
+purge_stats = PurgeStats() # Track what retention removed and bytes reclaimed
+pack_stats = PackStats() # Track the archive days packed into bundles
+dry_run = False # True - only report what retention would remove
+ping_results = {} # Ping result of each serial for this run
+machine_queues = {} # SlotQueue limiting the copies from each machine
+#The copy pool is the limit on copies into the archive share
+copy_pool_size = min(copy_workers, share_copy_workers)
+made_folders = set() # Archive folders already created/confirmed this run (or watch round)
+folder_lock = threading.Lock() # Guards made_folders across threads
+watch_marks = None # WatchMarks of each machine (opened by watch)
+folder_mtimes = {} # Forms folder date modified at each machine's last listing
+pending = set() # Machines with forms past the mark that aren't old enough yet
 
 
-def ping(serial):
+def ping(serial, timeout = ping_timeout, count = ping_count):
     '''
     Parameter:
         serial (str): serial of a machine to ping
+        timeout (int): milliseconds to wait for each reply
+        count (int): number of echo requests to send
     Return:
         True if the machine is pinged successfully, False if it is not.
     '''
-    return os.system("ping " + serial) == 0
+    #Only ping each machine once per run
+    if serial in ping_results:
+        return ping_results[serial]
+
+    #Windows ping takes the timeout in ms, Linux in seconds
+    if os.name == 'nt':
+        command = ["ping", "-n", str(count), "-w", str(timeout), serial]
+    else:
+        command = ["ping", "-c", str(count), "-W",
+                   str(max(1, timeout // 1000)), serial]
+
+    try:
+        with run_stats.stage("ping", serial):
+            result = subprocess.run(command, stdout = subprocess.DEVNULL,
+                                    stderr = subprocess.DEVNULL)
+        ping_results[serial] = result.returncode == 0
+    except OSError:
+        ping_results[serial] = False
+
+    return ping_results[serial]
+
+def probe_machines(serials, workers = ping_workers):
+    '''
+    Ping all the machines at the same time.
+    
+    Parameters:
+        serials: serials of the machines to ping
+        workers: number of machines pinged at the same time
+    Yields:
+        (serial, reachable) for each machine as soon as its ping returns
+    '''
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        probes = {pool.submit(ping, serial): serial for serial in serials}
+        
+        for probe in as_completed(probes):
+            yield (probes[probe], probe.result())
 
 def find_folder(loc, date):
     '''
@@ -49,66 +141,568 @@ def find_folder(loc, date):
     Returns:
         new_path (str): file path that the form will be saved to
     '''
-    
     #Get the date as a string
     date = date.strftime("%Y/%m/%d")
     #The new path in the archive
     new_path = os.path.join(archive_path, loc, date)
+    
+    #Only create each folder once per run
+    with folder_lock:
+        if new_path in made_folders:
+            return new_path
+    
     #create folder for the date and intermediate folders if necessary
     os.makedirs(new_path, exist_ok = True)
+    with folder_lock:
+        made_folders.add(new_path)
     
     return new_path
 
-#Logging format setup. Default level - WARNING, "w" - overwrite log
-logging.basicConfig(filename=log_path, format="%(asctime)s - %(levelname)s: %(message)s",
-                    datefmt='%m/%d/%Y %I:%M:%S %p', level=logging.INFO, filemode="w")
-
-#Read the excel of machines
-excel = pd.read_excel(machines_excel)
-#locations = df.iloc[:, 0].tolist()
-#serials = df.iloc[:, 6].tolist()
-locations = ["Kilmarnock, VA", "Kinsale, VA", "Hurlock, MD", "Cofield, NC", "Cofield, NC", "Cofield, NC", "Cofield, NC"]
-serials = ["2UA3110NCD", "2UA3110NCJ", "2UA55214W8", "2ua3110nbq", "2ua3110nby", "2ua3110nc2", "2ua3110ndx"]
-
-#Go through the locations and serials together.
-for (loc, serial) in zip(locations, serials):
-    #If the machine pings
-    if ping(serial):
-        #Go to the forms folder and get all the files
-        curr_path = "//4DLQ733/Mia/" + serial + "/c/Agris/datasets/001/Forms/"
+def prepare_folders(loc, dates):
+    '''
+    Create all the archive folders a machine's forms need before copying.
+    
+    Parameters:
+        loc: physical location of the machine
+        dates: dates of the forms that will be copied
+    '''
+    #One find_folder call for each distinct day
+    days = {}
+    for date in dates:
+        days.setdefault(date.date(), date)
+    
+    for date in days.values():
+        find_folder(loc, date)
+
+def list_forms(serial):
+    '''
+    Listing stage - get all the forms on a machine.
+    
+    Parameters:
+        serial: serial of the machine
+    Returns:
+        curr_path (str): path to the machine's forms folder
+        forms (list): names of the forms in the folder
+    '''
+    #Go to the forms folder and get all the files
+    curr_path = forms_path.format(serial = serial)
+    
+    with run_stats.stage("list", serial):
         forms = os.listdir(curr_path)
+    
+    return (curr_path, forms)
 
-        #Go through all the tickets.
-        for form in forms:
-            #Get ticket's date from its name.
-            date = form.split('_')[6]
-            date = datetime.strptime(date, '%y%m%d') #date as datetime object
+def filter_forms(loc, forms):
+    '''
+    Age filter stage - pick the forms that need to be archived.
+    
+    Parameters:
+        loc: physical location of the machine
+        forms: names of the forms on a machine
+    Yields:
+        (form, date, new) for each form older than the local max, where new is
+        True if it isn't archived yet (by this run or an earlier one)
+    '''
+    #Go through all the tickets.
+    for form in forms:
+        #Get ticket's fields from its name.
+        ticket = parse_ticket(form)
+        
+        #Skip anything that isn't a ticket form instead of stopping the run
+        if ticket is None:
+            logging.warning("Skipped form with an unexpected name - " + form)
+            continue
+        date = ticket.date
+        
+        #Forms past the archive max would be pruned right after copying
+        age = datetime.today() - date
+        if purge and age > archive_max:
+            logging.info("Form past archive max, not archived - " + form)
+            continue
+        
+        #If the form is older than the local max, archive it.
+        old = age > local_max
+        if(old and archive.claim(archive_key(loc, date, form))):
+            yield (form, date, True)
+        else:
+            logging.info("Form already in archive - " + form)
             
-            #If the form is older than the local max, archive it.
-            if(datetime.today() - date > local_max and form not in archive):
-                archive.append(form)
+            #Already archived forms can still be removed from the machine
+            if old:
+                yield (form, date, False)
+
+def copy_form(loc, serial, curr_path, form, date):
+    '''
+    Copy stage - copy a form to the archive (run through the machine's
+    SlotQueue, so the copies from one machine and into the share are limited).
+    
+    Parameters:
+        loc: physical location of the machine
+        serial: serial of the machine
+        curr_path: path to the machine's forms folder
+        form: name of the form
+        date: date of the form
+    Returns:
+        1 if the form was copied, 0 if the same form was already there
+    '''
+    with run_stats.stage("copy", serial):
+        try:
+            #Find or create the archive destination based on the form's date
+            archive_dest = find_folder(loc, date)
+            #Copy to the archive (skipped if it's already there)
+            copied = sync_copy(curr_path + form, archive_dest,
+                               machine_stats[serial], skip_unchanged,
+                               mtime_slack, verify_hash)
+        except OSError:
+            #Give the form back so the next listing tries it again
+            archive.release(archive_key(loc, date, form))
+            raise
+
+    #Save to the index so later runs skip it
+    archive.record(archive_key(loc, date, form))
 
-                #Find or create the archive destination based on the form's date
-                archive_dest = find_folder(loc, date)
-                #Copy to the archive
-                shutil.copy(curr_path + form, archive_dest)
-                #Track number archived
-                num_archived += 1
+    #logging's handlers lock around each record, so this is thread-safe
+    if not copied:
+        logging.info("Form already at archive destination - " + form)
+        return 0
 
-                if log_details:
-                    logging.info(form + " has been archived")
+    if log_details:
+        logging.info(form + " has been archived")
 
-                #Remove form from local os.remove(local_path + "/" + form)
-                #logging.info(form + " has been removed")
-                #num_local_removed += 1
+    #Remove form from local once the archived copy is verified
+    if remove_local_forms:
+        remove_form(loc, serial, curr_path, form, date)
 
-            else:
-                logging.info("Form already in archive - " + form)
+    return 1
+
+def remove_form(loc, serial, curr_path, form, date):
+    '''
+    Remove a form from a machine if its archived copy matches.
+    
+    Parameters:
+        loc: physical location of the machine
+        serial: serial of the machine
+        curr_path: path to the machine's forms folder
+        form: name of the form
+        date: date of the form
+    Returns:
+        True if the form was (or would be) removed, False otherwise
+    '''
+    archived = os.path.join(archive_path, loc, date.strftime("%Y/%m/%d"), form)
+    
+    #A locked or missing form is left for the next run instead of stopping it
+    try:
+        removed = remove_local(curr_path + form, archived, purge_stats,
+                               mtime_slack, remove_verify_hash, dry_run)
+    except OSError as error:
+        logging.warning("Couldn't remove local form - " + form + " (" +
+                        str(error) + ")")
+        run_stats.count(serial, removal_failures = 1)
+        return False
+    
+    if removed and log_details:
+        logging.info(form + (" would be" if dry_run else " has been") +
+                     " removed")
+    
+    return removed
 
+def archive_machine(loc, serial):
+    '''
+    List and filter the forms on a machine and queue the copies on the
+    machine's SlotQueue.
+    
+    Parameters:
+        loc: physical location of the machine
+        serial: serial of the machine
+    Returns:
+        jobs (list): (form, future) for each queued copy
+        removals (list): futures for the queued local removals
+    '''
+    curr_path, forms = list_forms(serial)
+    old_forms = list(filter_forms(loc, forms))
+    new_forms = [(form, date) for (form, date, new) in old_forms if new]
+    
+    #Forms that aren't old enough, are past the archive max, or aren't tickets
+    run_stats.count(serial, listings = 1, forms = len(forms),
+                    to_archive = len(new_forms),
+                    already_archived = len(old_forms) - len(new_forms),
+                    not_archived = len(forms) - len(old_forms))
+    
+    #Create each destination folder once, before any copies start
+    prepare_folders(loc, [date for (form, date) in new_forms])
+    
+    queue = machine_queues[serial]
+    jobs = [(form, queue.submit(copy_form, loc, serial, curr_path, form, date))
+            for (form, date) in new_forms]
+    
+    #Forms archived by earlier runs only need to be removed from the machine
+    removals = []
+    if remove_local_forms:
+        removals = [queue.submit(remove_form, loc, serial, curr_path, form,
+                                 date)
+                    for (form, date, new) in old_forms if not new]
+    
+    return (jobs, removals)
+
+def wait_copies(serial, jobs, retry):
+    '''
+    Wait for a machine's queued copies. A copy that fails is logged and
+    counted instead of stopping the run - copy_form already gave the form
+    back, so it's tried again.
+    
+    Parameters:
+        serial: serial of the machine
+        jobs: (form, future) for each queued copy
+        retry: when the failed forms are tried again ("poll" or "run")
+    Returns:
+        archived (int): number of forms copied
+        failed (int): number of copies that failed
+    '''
+    archived = 0
+    failed = 0
+    for (form, job) in jobs:
+        try:
+            archived += job.result()
+        except OSError as error:
+            logging.warning("Copy failed, trying again next " + retry + " - " +
+                            form + " (" + str(error) + ")")
+            failed += 1
+    
+    run_stats.count(serial, copy_failures = failed)
+    return (archived, failed)
+
+def poll_machine(loc, serial):
+    '''
+    Watch stage - archive only the forms past a machine's high-water mark. The
+    folder isn't listed at all if its date modified hasn't changed.
+    
+    Parameters:
+        loc: physical location of the machine
+        serial: serial of the machine
+    Returns:
+        archived (int): number of forms copied
+        found (bool): True if forms past the mark were handled (or have to be
+                      tried again)
+    '''
+    curr_path = forms_path.format(serial = serial)
+    
+    #One stat per poll - the folder changes when a form is added
+    with run_stats.stage("poll", serial):
+        mtime = os.stat(curr_path).st_mtime
+        if folder_mtimes.get(serial) == mtime and serial not in pending:
+            run_stats.count(serial, polls = 1)
+            return (0, False)
+        forms = os.listdir(curr_path)
+    
+    #Only the forms past the mark (names that aren't tickets are left to the
+    #nightly run to report)
+    tickets = {}
+    for form in forms:
+        ticket = parse_ticket(form)
+        if ticket is not None and watch_marks.past(serial, ticket):
+            tickets[form] = ticket
+    
+    old_forms = list(filter_forms(loc, tickets))
+    new_forms = [(form, date) for (form, date, new) in old_forms if new]
+    prepare_folders(loc, [date for (form, date) in new_forms])
+    
+    jobs = [(form, machine_queues[serial].submit(copy_form, loc, serial,
+                                                 curr_path, form, date))
+            for (form, date) in new_forms]
+    archived, failed = wait_copies(serial, jobs, "poll")
+    
+    if remove_local_forms:
+        for (form, date, new) in old_forms:
+            if not new:
+                remove_form(loc, serial, curr_path, form, date)
+    
+    run_stats.count(serial, polls = 1, listings = 1, forms = len(forms),
+                    past_mark = len(tickets))
+    
+    #Keep the folder date and the mark where they were if a copy failed, so
+    #the next poll lists the machine again and the form is still past the mark
+    if failed:
+        return (archived, True)
+    folder_mtimes[serial] = mtime
+    
+    #Move the mark past what was handled - forms that aren't old enough yet
+    #stay past it and are checked again on the next poll
+    today = datetime.today()
+    young = [form for form in tickets
+             if today - tickets[form].date <= local_max]
+    for form, ticket in tickets.items():
+        if form not in young:
+            watch_marks.advance(serial, ticket)
+    if young:
+        pending.add(serial)
     else:
-        #Log when a machine fails to ping
-        logging.warning("Machine failed to ping - " + serial)
+        pending.discard(serial)
+    
+    return (archived, len(old_forms) > 0)
+
+def watch(rounds = None):
+    '''
+    Keep polling the machines, each on its own backed off interval, and
+    archive new forms as they show up. Retention is left to the nightly run.
+    
+    Parameters:
+        rounds: number of polling rounds before stopping (None - run until
+                stopped with Ctrl+C)
+    '''
+    global num_archived, archive, watch_marks
+    
+    start_logging()
+    archive = ArchiveIndex(index_path, archive_path)
+    watch_marks = WatchMarks(watch_marks_path)
+    backoffs = {}
+    
+    try:
+        with ThreadPoolExecutor(max_workers = list_workers) as list_pool, \
+             ThreadPoolExecutor(max_workers = copy_pool_size) as copy_pool:
+            #Queues from an earlier watch are for a pool that's shut down
+            machine_queues.clear()
+            while rounds is None or rounds > 0:
+                #Machines added to the excel are picked up (it's cached)
+                machines = load_registry(machines_excel, registry_cache_path,
+                                         location_column, serial_column)
+                
+                #The nightly run can remove day folders (packing, retention)
+                #while this keeps running, so confirm them again every round
+                with folder_lock:
+                    made_folders.clear()
+                
+                now = time.monotonic()
+                polls = {}
+                for (loc, serial) in machines:
+                    backoff = backoffs.setdefault(
+                        serial, Backoff(watch_interval, watch_max_interval))
+                    if not backoff.due(now):
+                        continue
+                    
+                    if serial not in machine_queues:
+                        machine_queues[serial] = SlotQueue(
+                            copy_pool, machine_copy_workers)
+                    machine_stats.setdefault(serial, CopyStats())
+                    polls[list_pool.submit(poll_machine, loc, serial)] = serial
+                
+                for poll in as_completed(polls):
+                    serial = polls[poll]
+                    try:
+                        archived, found = poll.result()
+                    except OSError:
+                        #Unreachable machines back off like idle ones
+                        logging.warning("Machine unreachable - " + serial)
+                        archived, found = 0, False
+                    
+                    num_archived += archived
+                    backoffs[serial].update(found)
+                
+                #Save progress after every round
+                archive.commit()
+                watch_marks.save()
+                
+                if rounds is not None:
+                    rounds -= 1
+                    if rounds == 0:
+                        break
+                
+                #Sleep until the next machine is due
+                next_poll = min(backoff.next_poll for backoff in
+                                backoffs.values())
+                time.sleep(max(0, next_poll - time.monotonic()))
+    except KeyboardInterrupt:
+        logging.info("Watch stopped")
+    finally:
+        archive.close()
+        watch_marks.save()
+    
+    add_machine_stats()
+    logging.info("Total forms archived: " + str(num_archived))
+    logging.info("Bytes copied: " + str(copy_stats.bytes_copied) +
+                 ", bytes saved by skipping " + str(copy_stats.skipped) +
+                 " unchanged forms: " + str(copy_stats.bytes_saved))
+
+def add_machine_stats():
+    '''
+    Add up the copies of each machine into the run totals.
+    '''
+    for serial, stats in machine_stats.items():
+        copy_stats.merge(stats)
+        run_stats.count(serial, copied = stats.copied, skipped = stats.skipped,
+                        bytes_copied = stats.bytes_copied,
+                        bytes_saved = stats.bytes_saved)
+
+def start_logging():
+    '''
+    Log to the log file (overwritten each run).
+    '''
+    #Logging format setup. Default level - WARNING, "w" - overwrite log
+    logging.basicConfig(filename=log_path, format="%(asctime)s - %(levelname)s: %(message)s",
+                        datefmt='%m/%d/%Y %I:%M:%S %p', level=logging.INFO, filemode="w")
 
-#Log script summary
-logging.info("Total forms archived: " + str(num_archived))
+def main(argv = None):
+    '''
+    Ping every machine and archive the ones that respond as soon as they do,
+    then apply the retention rules.
+    
+    Parameters:
+        argv: command line arguments (defaults to sys.argv)
+    '''
+    global dry_run
+    
+    #Command line options
+    parser = argparse.ArgumentParser(description = "Archive the oneWeigh "
+                                     "forms on each machine.")
+    parser.add_argument('--dry-run', action = 'store_true',
+                        help = "report what retention would remove (and "
+                               "packing would pack) without changing anything")
+    parser.add_argument('--watch', action = 'store_true',
+                        help = "keep running and archive new forms as they "
+                               "show up on the machines")
+    parser.add_argument('--rounds', type = int, default = None,
+                        help = "with --watch, stop after this many polling "
+                               "rounds")
+    parser.add_argument('--pack', action = 'store_true',
+                        help = "only pack every closed day of the archive into "
+                               "bundles (migrates a per-file archive)")
+    parser.add_argument('--stats', default = run_stats_path,
+                        help = "JSON file to write the run summary to")
+    parser.add_argument('--profile', metavar = 'PATH', default = None,
+                        help = "profile the run with cProfile and save the "
+                               "stats to PATH")
+    args = parser.parse_args(argv)
+    dry_run = args.dry_run
+    
+    with profiled(args.profile):
+        if args.watch:
+            watch(args.rounds)
+        elif args.pack:
+            pack_all()
+        else:
+            archive_all()
+    
+    #Save the stage times and counters of each machine
+    run_stats.write(args.stats)
+
+def archive_all():
+    '''
+    Archive every machine and apply the retention rules, then log the totals.
+    '''
+    global num_archived, num_local_removed, archive
+    
+    start_logging()
+
+    #Read the locations and serials from the excel of machines (cached)
+    with run_stats.stage("registry"):
+        machines = load_registry(machines_excel, registry_cache_path,
+                                 location_column, serial_column)
+    serials = [serial for (loc, serial) in machines]
+    machine_locs = {serial: loc for (loc, serial) in machines}
+
+    #Index of what earlier runs archived (built from the archive the first time)
+    archive = ArchiveIndex(index_path, archive_path)
+    
+    #Always close the index so the forms recorded so far are committed
+    try:
+        with run_stats.stage("archive"), \
+             ThreadPoolExecutor(max_workers = list_workers) as list_pool, \
+             ThreadPoolExecutor(max_workers = copy_pool_size) as copy_pool:
+            #Each machine's copies wait in its own queue instead of holding up
+            #the other machines' copies in the pool
+            for serial in serials:
+                machine_queues[serial] = SlotQueue(copy_pool,
+                                                   machine_copy_workers)
+                machine_stats[serial] = CopyStats()
+
+            #Ping all the machines at once, listing each one as soon as it
+            #responds
+            listings = {}
+            for (serial, reachable) in probe_machines(serials):
+                if reachable:
+                    listings[list_pool.submit(
+                        archive_machine, machine_locs[serial], serial)] = serial
+
+                else:
+                    #Log when a machine fails to ping
+                    logging.warning("Machine failed to ping - " + serial)
+
+            #Wait for every machine's copies and count them
+            for listing in as_completed(listings):
+                serial = listings[listing]
+                try:
+                    jobs, removals = listing.result()
+                except OSError as error:
+                    #A share that pings but can't be listed is skipped
+                    logging.warning("Machine couldn't be listed - " + serial +
+                                    " (" + str(error) + ")")
+                    run_stats.count(serial, listing_failures = 1)
+                    continue
+
+                archived, failed = wait_copies(serial, jobs, "run")
+                num_archived += archived
+                for removal in removals:
+                    removal.result()
+
+        add_machine_stats()
+
+        #Prune the archive folders past the max age
+        if purge:
+            with run_stats.stage("purge"):
+                purge_archive(archive_path, archive_max, purge_stats, dry_run,
+                              archive)
+        
+        #Pack the closed days into bundles
+        if pack_bundles:
+            with run_stats.stage("pack"):
+                pack_archive(archive_path, pack_stats, archive, dry_run)
+        num_local_removed = purge_stats.local_files
+    finally:
+        archive.close()
+
+    #Log script summary
+    logging.info("Total forms archived: " + str(num_archived))
+    logging.info("Bytes copied: " + str(copy_stats.bytes_copied) +
+                 ", bytes saved by skipping " + str(copy_stats.skipped) +
+                 " unchanged forms: " + str(copy_stats.bytes_saved))
+    #One makedirs per folder instead of one per form
+    forms_copied = copy_stats.copied + copy_stats.skipped
+    logging.info("Archive folders created/confirmed: " + str(len(made_folders)) +
+                 ", makedirs calls avoided: " +
+                 str(max(0, forms_copied - len(made_folders))))
+    logging.info(("Retention (dry run) would reclaim: " if dry_run else
+                  "Retention reclaimed: ") +
+                 str(purge_stats.days) + " archive folders with " +
+                 str(purge_stats.archive_files) + " forms (" +
+                 str(purge_stats.archive_bytes) + " bytes), " +
+                 str(purge_stats.local_files) + " local forms (" +
+                 str(purge_stats.local_bytes) + " bytes)")
+    if pack_bundles:
+        log_packed()
+
+def pack_all():
+    '''
+    Pack every closed day of the archive into bundles without archiving
+    anything (migrates an existing per-file archive).
+    '''
+    global archive
+    
+    start_logging()
+    archive = ArchiveIndex(index_path, archive_path)
+    
+    with run_stats.stage("pack"):
+        pack_archive(archive_path, pack_stats, archive, dry_run)
+    
+    archive.close()
+    log_packed()
+
+def log_packed():
+    '''
+    Log what packing did (or would do).
+    '''
+    logging.info(("Packing (dry run) would pack: " if dry_run else
+                  "Packed: ") + str(pack_stats.days) + " archive days with " +
+                 str(pack_stats.forms) + " forms (" + str(pack_stats.bytes) +
+                 " bytes)")
 
+if __name__ == "__main__":
+    main()
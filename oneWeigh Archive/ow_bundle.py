@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+'''
+Packed daily bundles for the archive.
+
+Instead of one file per form, a closed day's forms can be packed into one
+uncompressed zip next to where its day folder was:
+    archive_path/<loc>/YYYY/MM/DD/<form>  ->  archive_path/<loc>/YYYY/MM/DD.zip
+
+The forms are stored without compression, so each PDF is one contiguous run of
+bytes in the bundle. The archive index keeps each form's bundle, offset and
+size (looked up by ticket number), so read_form can read one PDF with a seek
+and a read without opening the zip. Bundles are written to a temp name and
+renamed into place, and the loose forms are only removed once the bundle has
+them.
+'''
+from datetime import datetime
+import logging
+import os
+import shutil
+import struct
+import threading
+import zipfile
+import zlib
+from ow_copy import temp_suffix
+
+#Extension of a day's bundle
+bundle_suffix = ".zip"
+#Size of a zip local file header before the name and extra field
+local_header_size = 30
+#Bytes read at a time when checking a form against its bundle
+chunk_size = 1024 * 1024
+
+
+class PackStats:
+    '''
+    Thread-safe totals of what packing did (or would do).
+
+    Attributes:
+        days (int): day folders packed
+        forms (int): forms packed into bundles
+        bytes (int): bytes of the forms packed
+    '''
+    def __init__(self):
+        self.days = 0
+        self.forms = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add_day(self, forms, size):
+        with self._lock:
+            self.days += 1
+            self.forms += forms
+            self.bytes += size
+
+def bundle_of(dest):
+    '''
+    Parameters:
+        dest: path a form would have in the per-file tree
+              (archive_path/<loc>/YYYY/MM/DD/<form>)
+    Returns:
+        (path to the day's bundle, name of the form in the bundle)
+    '''
+    day_path, form = os.path.split(dest)
+    return (day_path.rstrip('/\\') + bundle_suffix, form)
+
+def bundle_day(name):
+    '''
+    Parameters:
+        name: name of a file in a month folder
+    Returns:
+        The DD of the day if the file is a bundle, None otherwise
+    '''
+    if not name.endswith(bundle_suffix):
+        return None
+
+    day = name[:-len(bundle_suffix)]
+    return day if day.isdigit() else None
+
+def bundle_entries(bundle):
+    '''
+    Find where each form's bytes are in a bundle.
+
+    Parameters:
+        bundle: path to the bundle
+    Returns:
+        entries (list): (form, offset, size) for each form in the bundle
+    '''
+    entries = []
+    with open(bundle, 'rb') as file, zipfile.ZipFile(file) as zip_file:
+        for info in zip_file.infolist():
+            #The data starts after the local header's name and extra field,
+            #which can differ from the central directory's
+            file.seek(info.header_offset)
+            header = file.read(local_header_size)
+            name_len, extra_len = struct.unpack('<HH', header[26:30])
+            entries.append((info.filename, info.header_offset +
+                            local_header_size + name_len + extra_len,
+                            info.file_size))
+
+    return entries
+
+def read_form(index, ticket, loc = None, day = None):
+    '''
+    Read one packed form straight out of its bundle.
+
+    Parameters:
+        index: ArchiveIndex with the bundle offsets
+        ticket: ticket number of the form
+        loc: physical location, if more than one site has the ticket number
+        day: "YYYY/MM/DD" of the ticket, if the number was used more than once
+    Returns:
+        (form name, contents of the PDF), or None if the ticket isn't packed
+    '''
+    for (form_loc, form_day, form, bundle, offset, size) in \
+        index.find_ticket(ticket):
+        if (loc is not None and form_loc != loc) or \
+           (day is not None and form_day != day):
+            continue
+
+        with open(bundle, 'rb') as file:
+            file.seek(offset)
+            return (form, file.read(size))
+
+    return None
+
+def same_member(src, dest, src_stat, mtime_slack, verify_hash):
+    '''
+    Check if a form's day bundle already has the same form as the source.
+
+    Parameters:
+        src: path to the source file
+        dest: path the form would have in the per-file tree
+        src_stat: os.stat of the source
+        mtime_slack: seconds the dates modified can be off by (zip dates
+                     only keep 2 second precision)
+        verify_hash: True - compare the CRC of the contents too
+    Returns:
+        True if the bundle has a matching copy, False otherwise
+    '''
+    bundle, form = bundle_of(dest)
+    try:
+        with zipfile.ZipFile(bundle) as zip_file:
+            info = zip_file.getinfo(form)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return False
+
+    if info.file_size != src_stat.st_size:
+        return False
+    packed_mtime = datetime(*info.date_time).timestamp()
+    if abs(packed_mtime - src_stat.st_mtime) > max(mtime_slack, 2):
+        return False
+
+    if verify_hash:
+        crc = 0
+        with open(src, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                crc = zlib.crc32(chunk, crc)
+        return crc == info.CRC
+
+    return True
+
+def pack_day(day_path, dry_run = False):
+    '''
+    Pack the forms in a day folder into the day's bundle and remove them.
+
+    Parameters:
+        day_path: path to the day folder
+        dry_run: True - only count what would be packed
+    Returns:
+        forms (int): number of forms packed
+        size (int): bytes of the forms packed
+        entries (list): (form, offset, size) of everything in the bundle
+                        (empty on a dry run)
+    '''
+    bundle = day_path.rstrip('/\\') + bundle_suffix
+    with os.scandir(day_path) as listing:
+        #Skip temp files left by an interrupted copy
+        forms = [entry for entry in listing if entry.is_file() and
+                 not entry.name.endswith(temp_suffix)]
+    size = sum(entry.stat().st_size for entry in forms)
+
+    if dry_run or not forms:
+        return (len(forms), size, [])
+
+    #Build the new bundle under a temp name, adding to the old one if a late
+    #form came in for a day that was already packed
+    temp = bundle + temp_suffix
+    if os.path.exists(bundle):
+        shutil.copy2(bundle, temp)
+    with zipfile.ZipFile(temp, 'a', zipfile.ZIP_STORED) as zip_file:
+        packed = set(zip_file.namelist())
+        for entry in forms:
+            if entry.name not in packed:
+                zip_file.write(entry.path, entry.name)
+
+    #Only remove the loose forms once the bundle has all of them
+    entries = bundle_entries(temp)
+    sizes = {form: form_size for (form, offset, form_size) in entries}
+    for entry in forms:
+        if sizes.get(entry.name) != entry.stat().st_size:
+            os.remove(temp)
+            raise OSError("Bundle doesn't match the day folder - " + day_path)
+
+    os.replace(temp, bundle)
+    for entry in forms:
+        os.remove(entry.path)
+    if not os.listdir(day_path):
+        os.rmdir(day_path)
+
+    return (len(forms), size, entries)
+
+def subfolders(path):
+    '''
+    Parameters:
+        path: path to a folder
+    Returns:
+        List of the DirEntry objects for the folders inside of it
+    '''
+    with os.scandir(path) as entries:
+        return [entry for entry in entries if entry.is_dir()]
+
+def archive_days(archive_path):
+    '''
+    Find every day in the archive tree, whether it's still a day folder or
+    has been packed into its bundle. Indexing, retention and packing all go
+    through this, so they agree on what a day is.
+
+    Parameters:
+        archive_path: path to the archive
+    Yields:
+        (loc, date as a datetime, path to the day folder or bundle, True if
+        the day is packed) for each day - folders and bundles whose names
+        aren't a date are skipped
+    '''
+    if not os.path.isdir(archive_path):
+        return
+
+    #archive_path/<loc>/YYYY/MM/DD (or DD.zip once packed)
+    for loc in subfolders(archive_path):
+        for year in subfolders(loc.path):
+            for month in subfolders(year.path):
+                #List the month first so the caller can remove days as it goes
+                with os.scandir(month.path) as entries:
+                    days = list(entries)
+
+                for day in days:
+                    packed = bundle_day(day.name)
+                    if packed is not None and day.is_file():
+                        name = packed
+                    elif day.is_dir():
+                        name = day.name
+                    else:
+                        continue
+
+                    try:
+                        date = datetime(int(year.name), int(month.name),
+                                        int(name))
+                    except ValueError:
+                        continue
+
+                    yield (loc.name, date, day.path, packed is not None)
+
+def pack_archive(archive_path, stats, index = None, dry_run = False,
+                 today = None):
+    '''
+    Pack every closed day folder in the archive into its bundle (also used
+    to migrate an existing per-file archive).
+
+    Parameters:
+        archive_path: path to the archive
+        stats: PackStats to add the results to
+        index: ArchiveIndex to save the bundle offsets in
+        dry_run: True - only count what would be packed
+        today: datetime of the current day (defaults to now)
+    Returns:
+        stats (PackStats): the updated stats
+    '''
+    today = today or datetime.today()
+
+    for (loc, date, day_path, packed) in list(archive_days(archive_path)):
+        #Only closed days that haven't been packed yet
+        if packed or date.date() >= today.date():
+            continue
+
+        forms, size, entries = pack_day(day_path, dry_run)
+        if not forms:
+            continue
+
+        stats.add_day(forms, size)
+        logging.info(("Would pack " if dry_run else "Packed ") + day_path)
+        if index is not None and not dry_run:
+            index.record_bundle(loc, date.strftime("%Y/%m/%d"),
+                                day_path.rstrip('/\\') +
+                                bundle_suffix, entries)
+
+    return stats
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+'''
+Sync-style copying for the archive. A form that is already at the destination
+with the same size and date modified (and optionally the same content hash)
+is skipped. Copies are written to a temp name and renamed into place, so an
+interrupted run never leaves a half-written PDF in the archive.
+'''
+import hashlib
+import os
+import shutil
+import threading
+
+#Suffix of the temp file a form is copied to before it's renamed
+temp_suffix = ".part"
+#Bytes read at a time when hashing
+chunk_size = 1024 * 1024
+
+
+class CopyStats:
+    '''
+    Thread-safe totals of what the copies did in a run.
+
+    Attributes:
+        copied (int): number of forms copied
+        skipped (int): number of forms already at the destination
+        bytes_copied (int): bytes sent to the archive
+        bytes_saved (int): bytes not sent because the form was already there
+    '''
+    def __init__(self):
+        self.copied = 0
+        self.skipped = 0
+        self.bytes_copied = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def add(self, copied, size):
+        '''
+        Parameters:
+            copied: True if the form was copied, False if it was skipped
+            size: size of the form in bytes
+        '''
+        with self._lock:
+            if copied:
+                self.copied += 1
+                self.bytes_copied += size
+            else:
+                self.skipped += 1
+                self.bytes_saved += size
+
+    def merge(self, other):
+        '''
+        Parameters:
+            other: CopyStats to add the totals of
+        '''
+        with self._lock:
+            self.copied += other.copied
+            self.skipped += other.skipped
+            self.bytes_copied += other.bytes_copied
+            self.bytes_saved += other.bytes_saved
+
+def file_hash(path):
+    '''
+    Parameters:
+        path: path to a file
+    Returns:
+        Hex digest of the file's content, read in chunks
+    '''
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def same_file(src, dest, src_stat, mtime_slack, verify_hash):
+    '''
+    Check if the destination already has the same file as the source.
+
+    Parameters:
+        src: path to the source file
+        dest: path to the destination file
+        src_stat: os.stat of the source
+        mtime_slack: seconds the dates modified can be off by (file systems
+                     like FAT only keep 2 second precision)
+        verify_hash: True - compare the content hashes too
+    Returns:
+        True if the destination matches, False otherwise
+    '''
+    try:
+        dest_stat = os.stat(dest)
+    except FileNotFoundError:
+        return False
+
+    #Different sizes can't be the same form
+    if dest_stat.st_size != src_stat.st_size:
+        return False
+
+    #Same size and date modified - only read the files if asked to
+    same_mtime = abs(dest_stat.st_mtime - src_stat.st_mtime) <= mtime_slack
+    if not verify_hash:
+        return same_mtime
+
+    return file_hash(src) == file_hash(dest)
+
+def sync_copy(src, dest_dir, stats, skip_unchanged = True, mtime_slack = 2,
+              verify_hash = False):
+    '''
+    Copy a file into a folder unless it's already there, writing to a temp
+    name first and renaming it into place.
+
+    Parameters:
+        src: path to the source file
+        dest_dir: folder to copy the file into
+        stats: CopyStats to add the result to
+        skip_unchanged: True - skip files that are already at the destination
+        mtime_slack: seconds the dates modified can be off by
+        verify_hash: True - also compare content hashes before skipping
+    Returns:
+        True if the file was copied, False if it was skipped
+    '''
+    dest = os.path.join(dest_dir, os.path.basename(src))
+    src_stat = os.stat(src)
+
+    if skip_unchanged and same_file(src, dest, src_stat, mtime_slack,
+                                    verify_hash):
+        stats.add(False, src_stat.st_size)
+        return False
+
+    #Copy to a temp name (with the date modified) then rename over the dest
+    temp = dest + temp_suffix
+    try:
+        shutil.copy2(src, temp)
+        os.replace(temp, dest)
+    except BaseException:
+        #Don't leave the partial copy behind
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+    stats.add(True, src_stat.st_size)
+    return True
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+'''
+Persistent index of the forms that are already in the archive.
+
+The index is a local SQLite file of (location, date, form) rows. It is built
+from the archive_path/<loc>/YYYY/MM/DD tree the first time it is used, and it
+is loaded into a set at start up so membership checks are constant-time.
+
+Forms packed into daily bundles (see ow_bundle) also get a row with their
+ticket number, bundle, offset and size, so one form can be read straight out
+of its bundle.
+'''
+import os
+import sqlite3
+import threading
+from ow_bundle import archive_days, bundle_entries
+from ow_copy import temp_suffix
+from ow_ticket import parse_ticket
+
+#Rows written before the index is committed to disk
+commit_every = 100
+
+
+def archive_key(loc, date, form):
+    '''
+    Parameters:
+        loc: physical location of the machine the form is from
+        date: date of the form (datetime)
+        form: name of the form
+    Returns:
+        (loc, "YYYY/MM/DD", form) key for the index
+    '''
+    return (loc, date.strftime("%Y/%m/%d"), form)
+
+def walk_archive(archive_path, bundles = None):
+    '''
+    Find every form in the date partitioned archive tree.
+
+    Parameters:
+        archive_path: path to the archive
+        bundles: optional list to add (loc, "YYYY/MM/DD", bundle path,
+                 entries from ow_bundle.bundle_entries) to for each bundle
+    Yields:
+        (loc, "YYYY/MM/DD", form) for each form in the archive, loose or
+        packed into a bundle
+    '''
+    for (loc, date, path, packed) in archive_days(archive_path):
+        day = date.strftime("%Y/%m/%d")
+
+        #Packed days are a DD.zip bundle instead of a folder
+        if packed:
+            entries = bundle_entries(path)
+            if bundles is not None:
+                bundles.append((loc, day, path, entries))
+            for (form, offset, size) in entries:
+                yield (loc, day, form)
+            continue
+
+        with os.scandir(path) as forms:
+            for form in forms:
+                #Skip temp files left by an interrupted copy
+                if form.is_file() and not form.name.endswith(temp_suffix):
+                    yield (loc, day, form.name)
+
+class ArchiveIndex:
+    '''
+    Index of the forms in the archive.
+
+    Attributes:
+        path (str): path to the SQLite file
+        archive_path (str): path to the archive the index is for
+    '''
+    def __init__(self, path, archive_path):
+        '''
+        Open the index, building it from the archive tree if it's new.
+        '''
+        self.path = path
+        self.archive_path = archive_path
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(path, check_same_thread = False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS forms (loc TEXT, "
+                         "day TEXT, form TEXT, PRIMARY KEY (loc, day, form))")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY "
+                         "KEY, value TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS bundled (loc TEXT, "
+                         "day TEXT, form TEXT, ticket INTEGER, bundle TEXT, "
+                         "offset INTEGER, size INTEGER, PRIMARY KEY (loc, "
+                         "day, form))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS bundled_ticket ON "
+                         "bundled (ticket)")
+
+        #Build from the archive tree the first time
+        built = self._db.execute("SELECT value FROM meta WHERE key = "
+                                 "'archive_path'").fetchone()
+        if built is None or built[0] != archive_path:
+            self.rebuild()
+
+        self._keys = set(self._db.execute("SELECT loc, day, form FROM forms"))
+
+    def rebuild(self):
+        '''
+        Replace the index with what is currently in the archive tree.
+        '''
+        bundles = []
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM forms")
+            self._db.execute("DELETE FROM bundled")
+            self._db.executemany("INSERT OR IGNORE INTO forms VALUES (?, ?, ?)",
+                                 walk_archive(self.archive_path, bundles))
+            for (loc, day, bundle, entries) in bundles:
+                self._insert_bundle(loc, day, bundle, entries)
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES "
+                             "('archive_path', ?)", (self.archive_path,))
+        self._keys = set(self._db.execute("SELECT loc, day, form FROM forms"))
+
+    def __contains__(self, key):
+        '''
+        Parameters:
+            key: (loc, "YYYY/MM/DD", form) key from archive_key
+        Returns:
+            True if the form is in the archive (or claimed this run)
+        '''
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def claim(self, key):
+        '''
+        Claim a form to be archived so it is only copied once per run.
+
+        Parameters:
+            key: (loc, "YYYY/MM/DD", form) key from archive_key
+        Returns:
+            True if the form wasn't archived or claimed yet, False otherwise
+        '''
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+            return True
+
+    def release(self, key):
+        '''
+        Give back the claim on a form whose copy failed, so a later listing
+        picks it up again.
+
+        Parameters:
+            key: (loc, "YYYY/MM/DD", form) key from archive_key
+        '''
+        with self._lock:
+            self._keys.discard(key)
+
+    def record(self, key):
+        '''
+        Save a form to the index once it has been copied to the archive.
+
+        Parameters:
+            key: (loc, "YYYY/MM/DD", form) key from archive_key
+        '''
+        with self._lock:
+            self._keys.add(key)
+            self._db.execute("INSERT OR IGNORE INTO forms VALUES (?, ?, ?)",
+                             key)
+            self._pending += 1
+
+            #Commit in batches instead of once per form
+            if self._pending >= commit_every:
+                self._db.commit()
+                self._pending = 0
+
+    def record_bundle(self, loc, day, bundle, entries):
+        '''
+        Save where a packed day's forms are in its bundle.
+
+        Parameters:
+            loc: physical location the bundle is for
+            day: "YYYY/MM/DD" of the bundle
+            bundle: path to the bundle
+            entries: (form, offset, size) of each form in the bundle
+        '''
+        with self._lock, self._db:
+            self._insert_bundle(loc, day, bundle, entries)
+            self._keys.update((loc, day, form) for (form, offset, size)
+                              in entries)
+
+    def find_ticket(self, ticket):
+        '''
+        Parameters:
+            ticket: ticket number of a form
+        Returns:
+            List of (loc, "YYYY/MM/DD", form, bundle, offset, size) for each
+            packed form with the ticket number
+        '''
+        with self._lock:
+            return self._db.execute("SELECT loc, day, form, bundle, offset, "
+                                    "size FROM bundled WHERE ticket = ?",
+                                    (ticket,)).fetchall()
+
+    def forget_day(self, loc, day):
+        '''
+        Remove a pruned day folder's forms from the index.
+
+        Parameters:
+            loc: physical location the folder is for
+            day: "YYYY/MM/DD" of the folder
+        '''
+        with self._lock:
+            #Only drop the day's own keys (found with the primary key) instead
+            #of going through every key in the archive
+            self._keys.difference_update(self._db.execute(
+                "SELECT loc, day, form FROM forms WHERE loc = ? AND day = ?",
+                (loc, day)))
+            self._db.execute("DELETE FROM forms WHERE loc = ? AND day = ?",
+                             (loc, day))
+            self._db.execute("DELETE FROM bundled WHERE loc = ? AND day = ?",
+                             (loc, day))
+
+    def commit(self):
+        '''
+        Commit the forms recorded so far (a long running watch commits after
+        every poll instead of waiting for close).
+        '''
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+
+    def close(self):
+        '''
+        Commit the last forms and close the SQLite file.
+        '''
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def _insert_bundle(self, loc, day, bundle, entries):
+        #Save the bundle rows (and the forms) - the lock is already held
+        rows = []
+        for (form, offset, size) in entries:
+            ticket = parse_ticket(form)
+            rows.append((loc, day, form, ticket and ticket.ticket, bundle,
+                         offset, size))
+
+        self._db.executemany("INSERT OR REPLACE INTO bundled VALUES "
+                             "(?, ?, ?, ?, ?, ?, ?)", rows)
+        self._db.executemany("INSERT OR IGNORE INTO forms VALUES (?, ?, ?)",
+                             [row[:3] for row in rows])
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+'''
+Registry of the oneWeigh machines, read from the contacts and installations
+workbook.
+
+Only the location and serial columns are read, streaming the rows with a
+read-only workbook. The parsed registry is cached in a local JSON file and is
+only read from the workbook again when the workbook's date modified or size
+changes.
+'''
+import json
+import logging
+import os
+import sys
+from openpyxl import load_workbook
+
+#Writing JSON state files, shared with the Crystal inventory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                             'Shared'))
+from json_files import write_json
+
+
+def read_registry(excel_path, loc_col, serial_col):
+    '''
+    Read the machines from the workbook.
+
+    Parameters:
+        excel_path: path to the contacts and installations workbook
+        loc_col: index of the location column
+        serial_col: index of the serial column
+    Returns:
+        machines (list): [location, serial] of each machine
+    '''
+    machines = []
+    workbook = load_workbook(excel_path, read_only = True, data_only = True)
+    try:
+        sheet = workbook.worksheets[0]
+        last_col = max(loc_col, serial_col) + 1
+
+        #Skip the header row and only read up to the columns needed
+        for row in sheet.iter_rows(min_row = 2, max_col = last_col,
+                                   values_only = True):
+            if len(row) < last_col:
+                continue
+            loc, serial = row[loc_col], row[serial_col]
+
+            #Skip rows without a machine
+            if loc is None or serial is None:
+                continue
+            machines.append([str(loc).strip(), str(serial).strip()])
+    finally:
+        workbook.close()
+
+    return machines
+
+def load_registry(excel_path, cache_path, loc_col = 0, serial_col = 6):
+    '''
+    Get the machines, using the cached registry if the workbook hasn't changed.
+
+    Parameters:
+        excel_path: path to the contacts and installations workbook
+        cache_path: path to the local registry cache
+        loc_col: index of the location column
+        serial_col: index of the serial column
+    Returns:
+        machines (list): [location, serial] of each machine
+    '''
+    #The cache from the last time the workbook was read
+    try:
+        with open(cache_path, 'r') as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        cache = None
+
+    try:
+        stat = os.stat(excel_path)
+    except OSError:
+        #Can't reach the workbook - fall back to the last registry read
+        if cache is not None:
+            logging.warning("Machines workbook unavailable, using cached "
+                            "registry - " + excel_path)
+            return cache['machines']
+        raise
+
+    #Use the cache if it's for the same, unchanged workbook and columns
+    key = [excel_path, stat.st_mtime, stat.st_size, loc_col, serial_col]
+    if cache is not None and cache['key'] == key:
+        return cache['machines']
+
+    machines = read_registry(excel_path, loc_col, serial_col)
+
+    write_json(cache_path, {'key': key, 'machines': machines})
+
+    return machines
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+'''
+Retention for the archive and the local machines.
+
+The archive is partitioned as archive_path/<loc>/YYYY/MM/DD, so a form's age
+is known from its folder. Whole day folders older than archive_max are pruned
+without checking the files inside of them one by one (packed days are pruned
+by removing their DD.zip bundle). Local forms are only removed once their
+archived copy, loose or in a bundle, has been verified.
+'''
+from datetime import datetime
+import logging
+import os
+import shutil
+import threading
+import zipfile
+from ow_bundle import archive_days, same_member
+from ow_copy import same_file
+
+
+class PurgeStats:
+    '''
+    Thread-safe totals of what retention removed (or would remove).
+
+    Attributes:
+        days (int): archive day folders pruned
+        archive_files (int): forms in the pruned day folders
+        archive_bytes (int): bytes reclaimed on the archive share
+        local_files (int): forms removed from local machines
+        local_bytes (int): bytes reclaimed on local machines
+    '''
+    def __init__(self):
+        self.days = 0
+        self.archive_files = 0
+        self.archive_bytes = 0
+        self.local_files = 0
+        self.local_bytes = 0
+        self._lock = threading.Lock()
+
+    def add_day(self, files, size):
+        with self._lock:
+            self.days += 1
+            self.archive_files += files
+            self.archive_bytes += size
+
+    def add_local(self, size):
+        with self._lock:
+            self.local_files += 1
+            self.local_bytes += size
+
+def day_size(path):
+    '''
+    Parameters:
+        path: path to a day folder
+    Returns:
+        (number of files, total bytes) in the folder - the sizes come with
+        the listing on Windows, so this is one round trip
+    '''
+    files = 0
+    size = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                files += 1
+                size += entry.stat().st_size
+
+    return (files, size)
+
+def remove_empty(path, dry_run):
+    '''
+    Remove a folder if there's nothing left in it.
+
+    Parameters:
+        path: path to the folder
+        dry_run: True - don't remove anything
+    '''
+    if not dry_run and not os.listdir(path):
+        os.rmdir(path)
+
+def purge_archive(archive_path, max_age, stats, dry_run = False, index = None,
+                  today = None):
+    '''
+    Prune the day folders in the archive that are older than the max age.
+
+    Parameters:
+        archive_path: path to the archive
+        max_age: timedelta of how long forms are kept in the archive
+        stats: PurgeStats to add the results to
+        dry_run: True - only count what would be pruned
+        index: ArchiveIndex to remove the pruned forms from
+        today: datetime to measure ages from (defaults to now)
+    Returns:
+        stats (PurgeStats): the updated stats
+    '''
+    today = today or datetime.today()
+    months = []
+
+    for (loc, date, path, packed) in list(archive_days(archive_path)):
+        #Skip days that aren't old enough
+        if today - date <= max_age:
+            continue
+
+        #Packed days are pruned by removing their DD.zip bundle
+        if packed:
+            with zipfile.ZipFile(path) as zip_file:
+                files = len(zip_file.infolist())
+            size = os.path.getsize(path)
+        else:
+            files, size = day_size(path)
+
+        stats.add_day(files, size)
+        logging.info(("Would prune " if dry_run else "Pruned ") + path)
+
+        if not dry_run:
+            if packed:
+                os.remove(path)
+            else:
+                shutil.rmtree(path)
+            if index is not None:
+                index.forget_day(loc, date.strftime("%Y/%m/%d"))
+
+        month = os.path.dirname(path)
+        if month not in months:
+            months.append(month)
+
+    #Remove the month and year folders the pruning left empty
+    for month in months:
+        remove_empty(month, dry_run)
+        remove_empty(os.path.dirname(month), dry_run)
+
+    return stats
+
+def remove_local(src, dest, stats, mtime_slack = 2, verify_hash = False,
+                 dry_run = False):
+    '''
+    Remove a local form once its archived copy is verified.
+
+    Parameters:
+        src: path to the local form
+        dest: path to the form in the archive (its day's bundle is checked
+              if the day has been packed)
+        stats: PurgeStats to add the result to
+        mtime_slack: seconds the dates modified can be off by
+        verify_hash: True - compare the content hashes too
+        dry_run: True - only count what would be removed
+    Returns:
+        True if the form was (or would be) removed, False otherwise
+    '''
+    src_stat = os.stat(src)
+
+    #Never remove a form that isn't safely in the archive (loose or packed)
+    if not (same_file(src, dest, src_stat, mtime_slack, verify_hash) or
+            same_member(src, dest, src_stat, mtime_slack, verify_hash)):
+        logging.warning("Archived copy doesn't match, kept local form - " + src)
+        return False
+
+    if not dry_run:
+        os.remove(src)
+    stats.add_local(src_stat.st_size)
+
+    return True
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+'''
+Parse oneWeigh ticket form names into records.
+
+A form name has every field of the ticket in it, for example:
+    ONE_Inbound_Ticket_064_0065584_501041_190416_11524526_KXS.PDF
+    (system)_(direction)_Ticket_(site)_(ticket number)_(customer)_
+    (date YYMMDD)_(time HHMMSSss)_(operator initials).PDF
+'''
+from collections import namedtuple
+from datetime import datetime
+import re
+
+#One pass over the whole name
+ticket_pattern = re.compile(
+    r'(?P<system>[^_]+)_(?P<direction>[^_]+)_Ticket_(?P<site>\d+)_'
+    r'(?P<ticket>\d+)_(?P<customer>[^_]+)_(?P<date>\d{6})_(?P<time>\d{6,8})_'
+    r'(?P<operator>[^_.]*)\.pdf', re.IGNORECASE)
+
+#Dates already converted - lots of forms share the same day
+date_cache = {}
+
+
+class Ticket(namedtuple('Ticket', ['name', 'system', 'direction', 'site',
+                                   'ticket', 'customer', 'date', 'time',
+                                   'operator'])):
+    '''
+    Fields of a ticket form's name.
+
+    Attributes:
+        name (str): the full form name
+        system (str): system the form is from (ex. "ONE")
+        direction (str): "Inbound" or "Outbound"
+        site (str): site number (ex. "064")
+        ticket (int): sequential ticket number
+        customer (str): customer number
+        date (datetime): date of the ticket
+        time (str): time of the ticket as HHMMSSss
+        operator (str): initials of the scale operator
+    '''
+    __slots__ = ()
+
+    @property
+    def timestamp(self):
+        '''
+        Returns:
+            The date and time of the ticket as a datetime object
+        '''
+        return self.date.replace(hour = int(self.time[0:2]),
+                                 minute = int(self.time[2:4]),
+                                 second = int(self.time[4:6]))
+
+def ticket_date(text):
+    '''
+    Parameters:
+        text: date from a form name as YYMMDD
+    Returns:
+        The date as a datetime object (same century rule as strptime's %y)
+    '''
+    date = date_cache.get(text)
+    if date is None:
+        year = int(text[0:2])
+        year += 2000 if year < 69 else 1900
+        date = datetime(year, int(text[2:4]), int(text[4:6]))
+        date_cache[text] = date
+
+    return date
+
+def parse_ticket(name):
+    '''
+    Parameters:
+        name: name of a form
+    Returns:
+        Ticket record for the form, or None if the name isn't a ticket form
+    '''
+    match = ticket_pattern.fullmatch(name)
+    if match is None:
+        return None
+
+    system, direction, site, ticket, customer, date, time, operator = \
+        match.groups()
+    try:
+        date = ticket_date(date)
+    except ValueError:
+        return None
+
+    return tuple.__new__(Ticket, (name, system, direction, site, int(ticket),
+                                  customer, date, time, operator))
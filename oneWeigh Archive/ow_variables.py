@@ -1,6 +1,29 @@
 local_max = 0 # Max age of local machine files
 archive_max = 7 # Max age of archive files
 archive_path = "//4DLQ733/Mia/Archive/"
+forms_path = "//4DLQ733/Mia/{serial}/c/Agris/datasets/001/Forms/" # Forms folder on each machine
 machines_excel = "//4DLQ733/Mia/oneWeigh - Contacts and Installations.xlsx" #Path to the excel of all the machines
 log_path = "//4DLQ733/Mia/log.txt" #Path to the log file
 log_details = False # True - show all details, False - show totals
+ping_timeout = 1000 # Milliseconds to wait for each ping reply
+ping_count = 1 # Number of echo requests sent to each machine
+ping_workers = 8 # Machines pinged at the same time
+list_workers = 4 # Machines listed at the same time
+copy_workers = 8 # Forms copied at the same time
+machine_copy_workers = 2 # Copies from a single machine at the same time
+share_copy_workers = 6 # Copies into the archive share at the same time
+index_path = "archive_index.db" # Local index of the archived forms (same directory as the script)
+skip_unchanged = True # True - skip forms that are already at the archive destination
+verify_hash = False # True - also compare content hashes before skipping a form
+mtime_slack = 2 # Seconds the dates modified can differ by and still match
+purge_archive = True # True - prune archive folders older than archive_max
+remove_local = False # True - remove local forms once their archived copy is verified
+remove_verify_hash = True # True - compare content hashes before removing a local form
+pack_bundles = False # True - pack each closed day of the archive into one uncompressed DD.zip bundle
+registry_cache_path = "machines_cache.json" # Local cache of the machines read from the excel
+location_column = 0 # Column of the machine locations in the excel (0 - first column)
+serial_column = 6 # Column of the machine serials in the excel
+watch_interval = 60 # Seconds between polls of a machine in watch mode (while it has new forms)
+watch_max_interval = 900 # Longest wait between polls of a machine with nothing new
+watch_marks_path = "watch_marks.json" # Ticket high-water mark of each machine for watch mode (same directory as the script)
+run_stats_path = "ow_run_stats.json" # Summary of the stage times and counters of each run (same directory as the script)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+'''
+State for the continuous watch mode of the archive.
+
+Every machine has a high-water mark - the (timestamp, ticket number) of the
+newest ticket form already handled - so a poll only looks at the forms past
+the mark. The marks are saved to a local JSON file so a restarted watch picks
+up where it left off. Each machine is polled on its own interval, which backs
+off while the machine has nothing new (or can't be reached) and resets as soon
+as new forms show up.
+'''
+from datetime import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+#Writing JSON state files, shared with the Crystal inventory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                             'Shared'))
+from json_files import write_json
+
+
+def ticket_key(ticket):
+    '''
+    Parameters:
+        ticket: Ticket record from ow_ticket.parse_ticket
+    Returns:
+        (timestamp, ticket number) the high-water marks are compared by
+    '''
+    try:
+        return (ticket.timestamp, ticket.ticket)
+    except ValueError:
+        #The time in the name isn't a real time - only use the day
+        return (ticket.date, ticket.ticket)
+
+class WatchMarks:
+    '''
+    High-water mark of each machine.
+
+    Attributes:
+        path (str): path to the JSON file the marks are saved to
+        marks (dict): keys:serials, values:(timestamp, ticket number) of the
+                      newest form handled on the machine
+    '''
+    def __init__(self, path):
+        '''
+        Load the marks saved by the last watch (none if there isn't a file).
+        '''
+        self.path = path
+        self.marks = {}
+        self._lock = threading.Lock()
+
+        try:
+            with open(path, 'r') as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            saved = {}
+
+        for serial, (timestamp, ticket) in saved.items():
+            self.marks[serial] = (datetime.fromisoformat(timestamp), ticket)
+
+    def past(self, serial, ticket):
+        '''
+        Parameters:
+            serial: serial of the machine
+            ticket: Ticket record of a form on the machine
+        Returns:
+            True if the form is past the machine's mark (or it has no mark)
+        '''
+        mark = self.marks.get(serial)
+        return mark is None or ticket_key(ticket) > mark
+
+    def advance(self, serial, ticket):
+        '''
+        Move a machine's mark up to a form that has been handled.
+
+        Parameters:
+            serial: serial of the machine
+            ticket: Ticket record of the form
+        '''
+        with self._lock:
+            if self.past(serial, ticket):
+                self.marks[serial] = ticket_key(ticket)
+
+    def save(self):
+        '''
+        Save the marks to the JSON file.
+        '''
+        with self._lock:
+            saved = {serial: [timestamp.isoformat(), ticket]
+                     for serial, (timestamp, ticket) in self.marks.items()}
+
+        write_json(self.path, saved)
+
+class Backoff:
+    '''
+    Polling interval of one machine.
+
+    Attributes:
+        interval (float): seconds until the next poll
+        next_poll (float): time.monotonic() the next poll is due at
+    '''
+    def __init__(self, min_interval, max_interval):
+        '''
+        Start at the shortest interval with the first poll due now.
+        '''
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.next_poll = 0.0
+
+    def due(self, now):
+        '''
+        Parameters:
+            now: current time.monotonic()
+        Returns:
+            True if the machine should be polled
+        '''
+        return now >= self.next_poll
+
+    def update(self, found):
+        '''
+        Schedule the next poll after one finishes.
+
+        Parameters:
+            found: True if the poll found new forms
+        '''
+        if found:
+            self.interval = self.min_interval
+        else:
+            #Double the wait each time there's nothing new, up to the max
+            self.interval = min(self.interval * 2, self.max_interval)
+
+        self.next_poll = time.monotonic() + self.interval